@@ -1,9 +1,27 @@
+import base64
+import bisect
+import json
+import logging
+import math
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Iterable, Iterator, Tuple, Callable
+import numpy as np
 import pandas as pd
 from werkzeug.security import generate_password_hash, check_password_hash
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = Path("database/ev_stations.db")
 
 SCHEMA_SQL = """
@@ -15,25 +33,27 @@ CREATE TABLE IF NOT EXISTS ev_charging_stations_reduced (
   city TEXT,
   pincode TEXT,
   charger_types TEXT,
-  number_of_chargers TEXT,
+  number_of_chargers INTEGER,
   power_kW_each TEXT,
-  price_per_kWh_INR TEXT,
+  price_per_kWh_INR REAL,
   tariff_type TEXT,
   payment_methods TEXT,
   opening_hours TEXT,
   contact_number TEXT,
   email TEXT,
-  station_rating TEXT,
-  num_reviews TEXT,
-  parking_spaces TEXT,
+  station_rating REAL,
+  num_reviews INTEGER,
+  parking_spaces INTEGER,
   amenities TEXT,
   reservation_supported TEXT,
   fast_charging_supported TEXT,
   nearby_landmark TEXT,
-  uptime_percent TEXT,
+  uptime_percent REAL,
   status TEXT,
   latitude REAL,
-  longitude REAL
+  longitude REAL,
+  rating_sum REAL DEFAULT 0,
+  rating_count INTEGER DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS users (
@@ -94,18 +114,1050 @@ CREATE TABLE IF NOT EXISTS notifications (
   FOREIGN KEY (user_id) REFERENCES users(id),
   FOREIGN KEY (station_id) REFERENCES ev_charging_stations_reduced(station_id)
 );
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+  user_id INTEGER PRIMARY KEY,
+  unread INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS catalog_change_log (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  station_id TEXT,
+  kind TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS wallets (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER UNIQUE NOT NULL,
+  balance REAL NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS wallet_transactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  amount REAL NOT NULL,
+  transaction_type TEXT NOT NULL,
+  description TEXT,
+  booking_id INTEGER,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  idempotency_key TEXT,
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  FOREIGN KEY (booking_id) REFERENCES bookings(id)
+);
+
+CREATE TABLE IF NOT EXISTS payment_requests (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  amount REAL NOT NULL,
+  transaction_id TEXT,
+  payment_method TEXT,
+  status TEXT NOT NULL DEFAULT 'pending',
+  admin_notes TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  verified_at TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS geocode_cache (
+  place TEXT PRIMARY KEY,
+  latitude REAL,
+  longitude REAL,
+  resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  station_id TEXT NOT NULL,
+  booking_date TEXT NOT NULL,
+  booking_time TEXT NOT NULL,
+  duration_hours REAL NOT NULL,
+  total_amount REAL NOT NULL,
+  payment_status TEXT,
+  booking_status TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  FOREIGN KEY (station_id) REFERENCES ev_charging_stations_reduced(station_id)
+);
+"""
+
+
+# ==================== Connection Pool ====================
+
+POOL_SIZE = int(os.environ.get("EV_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("EV_DB_POOL_TIMEOUT", "30"))
+
+# Callables run on every newly opened pooled connection, e.g. to install
+# trace callbacks for diagnostics.
+CONNECTION_HOOKS: List[Callable[[sqlite3.Connection], None]] = []
+
+# Applied once when a pooled connection is opened, not on every checkout.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections to a single database file."""
+
+    def __init__(self, path: Path, max_size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT):
+        self.path = Path(path)
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        for hook in CONNECTION_HOOKS:
+            hook(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out an idle connection, opening one if under the limit."""
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._open < self.max_size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"connection pool exhausted after {self.timeout}s"
+                    )
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any open transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'path': str(self.path),
+                'max_size': self.max_size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': self._open - self._in_use,
+                'checkouts': self._checkouts,
+                'wait_total_ms': round(self._wait_total * 1000, 3),
+                'wait_avg_ms': round(
+                    self._wait_total * 1000 / self._checkouts, 3
+                ) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the pool for the current DB_PATH, rebuilding it if the path
+    changed or the process was forked."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.path == Path(DB_PATH) and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is not None and (
+            _pool.path != Path(DB_PATH) or _pool.pid != os.getpid()
+        ):
+            if _pool.pid == os.getpid():
+                _pool.close()
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+
+def close_pool():
+    """Close all pooled connections (e.g. before replacing the database file)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Checkout count, wait times and open/idle connection counts."""
+    return get_pool().stats()
+
+
+@contextmanager
+def get_conn() -> Iterator[sqlite3.Connection]:
+    """Check out a pooled connection for the duration of a ``with`` block.
+
+    Like ``with sqlite3.connect(...)``, the transaction is committed on a
+    clean exit and rolled back on error.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.release(conn)
+
+
+# ==================== Query Instrumentation ====================
+
+class QueryStats:
+    """Statements run, rows fetched and seconds spent in SQLite (executing
+    and fetching) for one unit of work, usually an HTTP request."""
+
+    __slots__ = ('queries', 'rows', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+
+# The QueryStats pooled connections charge their work to, per thread or
+# context; None (the default) means nothing is being measured.
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    'query_stats', default=None
+)
+
+
+def start_query_stats() -> QueryStats:
+    """Begin charging this context's SQL work to a fresh QueryStats."""
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def stop_query_stats() -> Optional[QueryStats]:
+    """Stop measuring and return what was recorded since start_query_stats."""
+    stats = _query_stats.get()
+    _query_stats.set(None)
+    return stats
+
+
+# Query tracing: per-fingerprint statistics and a slow-query log. Off
+# unless EV_QUERY_TRACE=1; admins can flip it (and the threshold) at
+# runtime from /admin/queries.
+QUERY_TRACE = os.environ.get("EV_QUERY_TRACE", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("EV_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = 200
+# The progress handler counts SQLite VM instructions in steps of this many.
+VM_STEP = 1000
+
+slow_query_logger = logging.getLogger(__name__ + ".slow_queries")
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"--[^\n]*|/\*.*?\*/", re.S), " "),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?+)"),
+    (re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so executions differing only in literals,
+    IN-list length or whitespace share one fingerprint."""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip().rstrip(';')
+
+
+class QueryTracer:
+    """Per-fingerprint count, total/max time, rows and VM steps, plus a
+    bounded log of statements slower than ``slow_ms`` with their plans."""
+
+    def __init__(self, enabled: bool = QUERY_TRACE, slow_ms: float = SLOW_QUERY_MS):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}
+        self._slow: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters,
+               seconds: float, rows: int, vm_steps: int):
+        key = fingerprint(sql)
+        with self._lock:
+            # [count, total seconds, max seconds, rows, vm steps]
+            entry = self._stats.setdefault(key, [0, 0.0, 0.0, 0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows
+            entry[4] += vm_steps
+        if seconds * 1000 < self.slow_ms:
+            return
+        plan = _explain(conn, sql, parameters)
+        slow_query_logger.warning(
+            "slow query %.1f ms, %d rows: %s | plan: %s",
+            seconds * 1000, rows, ' '.join(sql.split()), '; '.join(plan),
+        )
+        with self._lock:
+            self._slow.appendleft({
+                'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'ms': round(seconds * 1000, 2),
+                'rows': rows,
+                'vm_steps': vm_steps,
+                'sql': ' '.join(sql.split()),
+                'fingerprint': key,
+                'plan': plan,
+            })
+
+    def stats(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Fingerprints by total time, most expensive first."""
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda kv: -kv[1][1])[:limit]
+        return [
+            {
+                'fingerprint': key,
+                'count': count,
+                'total_ms': round(total * 1000, 2),
+                'avg_ms': round(total * 1000 / count, 3),
+                'max_ms': round(peak * 1000, 2),
+                'rows': rows,
+                'vm_steps': steps,
+            }
+            for key, (count, total, peak, rows, steps) in items
+        ]
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+
+
+query_tracer = QueryTracer()
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+    """EXPLAIN QUERY PLAN detail lines, untraced; empty when the statement
+    cannot be explained (DDL, PRAGMA, or parameters executemany consumed)."""
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    if head not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE'):
+        return []
+    try:
+        return [row[3] for row in sqlite3.Connection.execute(
+            conn, "EXPLAIN QUERY PLAN " + sql, parameters
+        )]
+    except (sqlite3.Error, ValueError, TypeError):
+        return []
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that charges its statements, fetched rows and time to the
+    active QueryStats and, while tracing is on, to query_tracer. Costs a
+    ContextVar lookup and a flag check when neither is active.
+
+    A traced statement's time covers execute() and every fetch until the
+    cursor is exhausted, re-executed, closed or collected."""
+
+    _traced = None  # [sql, parameters, seconds, rows, vm steps at start]
+
+    def execute(self, sql, parameters=()):
+        stats = _query_stats.get()
+        tracing = query_tracer.enabled
+        if stats is None and not tracing:
+            return super().execute(sql, parameters)
+        if self._traced:
+            self._finish_trace()
+        conn = self.connection
+        if tracing:
+            conn._track_vm_steps(True)
+        steps = conn.vm_steps
+        began = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - began
+            if stats is not None:
+                stats.queries += 1
+                stats.seconds += elapsed
+            if tracing:
+                self._traced = [sql, parameters, elapsed, 0, steps]
+                if self.description is None:
+                    self._traced[3] = max(self.rowcount, 0)
+                    self._finish_trace()
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = _query_stats.get()
+        tracing = query_tracer.enabled
+        if stats is None and not tracing:
+            return super().executemany(sql, seq_of_parameters)
+        if self._traced:
+            self._finish_trace()
+        conn = self.connection
+        if tracing:
+            conn._track_vm_steps(True)
+        steps = conn.vm_steps
+        began = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - began
+            if stats is not None:
+                stats.queries += 1
+                stats.seconds += elapsed
+            if tracing:
+                self._traced = [sql, (), elapsed, max(self.rowcount, 0), steps]
+                self._finish_trace()
+
+    def _finish_trace(self):
+        traced, self._traced = self._traced, None
+        if traced:
+            sql, parameters, seconds, rows, steps = traced
+            conn = self.connection
+            query_tracer.record(conn, sql, parameters, seconds, rows,
+                                conn.vm_steps - steps)
+
+    def _fetched(self, fetch, *args):
+        stats = _query_stats.get()
+        traced = self._traced
+        if stats is None and traced is None:
+            return fetch(*args)
+        began = time.perf_counter()
+        rows = fetch(*args)
+        elapsed = time.perf_counter() - began
+        count = len(rows) if isinstance(rows, list) else int(rows is not None)
+        if stats is not None:
+            stats.seconds += elapsed
+            stats.rows += count
+        if traced is not None:
+            traced[2] += elapsed
+            traced[3] += count
+            if fetch.__name__ == 'fetchall' or rows is None or (
+                    fetch.__name__ == 'fetchmany' and count < args[0]):
+                self._finish_trace()
+        return rows
+
+    def fetchone(self):
+        return self._fetched(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetched(super().fetchall)
+
+    def __next__(self):
+        stats = _query_stats.get()
+        traced = self._traced
+        if stats is None and traced is None:
+            return super().__next__()
+        began = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if traced is not None:
+                traced[2] += time.perf_counter() - began
+                self._finish_trace()
+            raise
+        finally:
+            if stats is not None:
+                stats.seconds += time.perf_counter() - began
+        if stats is not None:
+            stats.rows += 1
+        if traced is not None:
+            traced[2] += time.perf_counter() - began
+            traced[3] += 1
+        return row
+
+    def close(self):
+        if self._traced:
+            self._finish_trace()
+        super().close()
+
+    def __del__(self):
+        if self._traced:
+            try:
+                self._finish_trace()
+            except Exception:
+                pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the implicit ones behind
+    execute() and pandas reads, are InstrumentedCursors. While tracing is
+    on, a progress handler counts VM instructions for query_tracer."""
+
+    vm_steps = 0
+    _counting = False
+
+    def _count_step(self) -> int:
+        self.vm_steps += VM_STEP
+        return 0
+
+    def _track_vm_steps(self, on: bool):
+        if on != self._counting:
+            self.set_progress_handler(self._count_step if on else None, VM_STEP)
+            self._counting = on
+
+    def cursor(self, factory=InstrumentedCursor):
+        if self._counting and not query_tracer.enabled:
+            self._track_vm_steps(False)
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ==================== Schema Migrations ====================
+
+# Station columns stored as numbers; older databases (and the bundled SQL
+# dump) declare them TEXT.
+STATION_NUMERIC_COLUMNS = {
+    'number_of_chargers': 'INTEGER',
+    'price_per_kWh_INR': 'REAL',
+    'station_rating': 'REAL',
+    'num_reviews': 'INTEGER',
+    'parking_spaces': 'INTEGER',
+    'uptime_percent': 'REAL',
+}
+
+# Secondary indexes owned by init_db, keyed by name. Any other ``idx_``
+# index found in the database is treated as retired and dropped, so
+# renaming or removing an entry here is enough to migrate it.
+MANAGED_INDEXES = {
+    # Stations: listing order, equality filters, price/rating ranges
+    'idx_stations_listing':
+        'ev_charging_stations_reduced(city, operator, name)',
+    'idx_stations_operator': 'ev_charging_stations_reduced(operator)',
+    'idx_stations_status': 'ev_charging_stations_reduced(status)',
+    'idx_stations_fast':
+        'ev_charging_stations_reduced(fast_charging_supported)',
+    'idx_stations_price': 'ev_charging_stations_reduced(price_per_kWh_INR)',
+    'idx_stations_rating': 'ev_charging_stations_reduced(avg_rating)',
+    'idx_users_created': 'users(created_at)',
+    'idx_reviews_station_created': 'reviews(station_id, created_at)',
+    'idx_reviews_user_created': 'reviews(user_id, created_at)',
+    'idx_bookmarks_station_user': 'bookmarks(station_id, user_id)',
+    'idx_comments_station_created': 'comments(station_id, created_at)',
+    'idx_search_history_user_created': 'search_history(user_id, created_at)',
+    'idx_notifications_user_read_created':
+        'notifications(user_id, is_read, created_at)',
+    'idx_wallet_tx_user_created': 'wallet_transactions(user_id, created_at)',
+    'idx_payment_requests_status_created':
+        'payment_requests(status, created_at)',
+    'idx_payment_requests_user_created':
+        'payment_requests(user_id, created_at)',
+    'idx_payment_requests_created': 'payment_requests(created_at)',
+    'idx_bookings_user_status_date':
+        'bookings(user_id, booking_status, booking_date)',
+    'idx_bookings_station_date': 'bookings(station_id, booking_date)',
+    'idx_bookings_created': 'bookings(created_at)',
+}
+
+# A wallet operation carrying an idempotency key is applied at most once.
+MANAGED_UNIQUE_INDEXES = {
+    'idx_wallet_tx_idempotency':
+        'wallet_transactions(idempotency_key) '
+        'WHERE idempotency_key IS NOT NULL',
+}
+
+# Station rating shown in listings and used by the rating filters: the
+# imported station_rating/num_reviews blended with the user reviews
+# aggregated in rating_sum/rating_count.
+_AVG_RATING_EXPR = (
+    "CASE WHEN COALESCE(num_reviews, 0) + COALESCE(rating_count, 0) > 0 "
+    "THEN ROUND((COALESCE(station_rating, 0) * COALESCE(num_reviews, 0) "
+    "+ COALESCE(rating_sum, 0)) "
+    "/ (COALESCE(num_reviews, 0) + COALESCE(rating_count, 0)), 2) "
+    "ELSE station_rating END"
+)
+
+
+# Columns added after a table first shipped; CREATE TABLE IF NOT EXISTS
+# leaves older databases without them.
+# avg_rating is a generated column and is always added this way.
+ADDED_COLUMNS = {
+    'ev_charging_stations_reduced': {
+        'rating_sum': 'REAL DEFAULT 0',
+        'rating_count': 'INTEGER DEFAULT 0',
+        'avg_rating': f'REAL GENERATED ALWAYS AS ({_AVG_RATING_EXPR}) VIRTUAL',
+    },
+    'wallet_transactions': {'idempotency_key': 'TEXT'},
+}
+
+
+def ensure_columns(conn: sqlite3.Connection) -> List[str]:
+    """Add any ADDED_COLUMNS missing from existing tables; returns the
+    ``table.column`` names added."""
+    added = []
+    for table, columns in ADDED_COLUMNS.items():
+        present = {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+        for column, decl in columns.items():
+            if column not in present:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+                added.append(f"{table}.{column}")
+    return added
+
+
+def ensure_indexes(conn: sqlite3.Connection):
+    """Create missing managed indexes and drop retired ``idx_`` ones."""
+    existing = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'"
+        )
+    }
+    managed = {**MANAGED_INDEXES, **MANAGED_UNIQUE_INDEXES}
+    for name in existing - managed.keys():
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, target in managed.items():
+        if name not in existing:
+            unique = 'UNIQUE ' if name in MANAGED_UNIQUE_INDEXES else ''
+            conn.execute(
+                f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {target}"
+            )
+
+
+def _numeric_expr(column: str) -> str:
+    """SQL expression converting a TEXT column to a number, or NULL when the
+    value is not numeric (CAST alone would silently turn it into 0)."""
+    value = f"TRIM({column})"
+    return (
+        f"CASE WHEN typeof({column}) IN ('integer', 'real') THEN {column} "
+        f"WHEN {value} GLOB '*[0-9]*' AND {value} NOT GLOB '*[^0-9.eE+-]*' "
+        f"THEN CAST({value} AS REAL) ELSE NULL END"
+    )
+
+
+def migrate_station_columns(conn: sqlite3.Connection) -> bool:
+    """Rebuild the station table with typed numeric columns if needed.
+
+    SQLite cannot change a column type in place, so the table is copied into
+    a new one with the declared types, converting values on the way, and
+    swapped in within one transaction. Returns True if a rebuild happened.
+    """
+    info = conn.execute(
+        "PRAGMA table_info(ev_charging_stations_reduced)"
+    ).fetchall()
+    declared = {col[1]: (col[2] or '').upper() for col in info}
+    stale = [
+        c for c, t in STATION_NUMERIC_COLUMNS.items()
+        if c in declared and declared[c] != t
+    ]
+    if not stale:
+        return False
+
+    col_defs, select_exprs = [], []
+    for _, name, col_type, _, _, pk in info:
+        new_type = STATION_NUMERIC_COLUMNS.get(name, col_type or '')
+        col_defs.append(
+            f"{name} {new_type}" + (" PRIMARY KEY" if pk else "")
+        )
+        select_exprs.append(_numeric_expr(name) if name in stale else name)
+    names = ', '.join(col[1] for col in info)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Triggers on other tables that update this one would block the
+        # rename; init_db recreates them.
+        for trigger in RATING_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        dropped = conn.execute(
+            "SELECT " + ', '.join(
+                f"SUM({c} IS NOT NULL AND TRIM({c}) <> '' "
+                f"AND ({_numeric_expr(c)}) IS NULL)" for c in stale
+            ) + " FROM ev_charging_stations_reduced"
+        ).fetchone()
+        conn.execute("DROP TABLE IF EXISTS ev_charging_stations_typed")
+        conn.execute(
+            f"CREATE TABLE ev_charging_stations_typed ({', '.join(col_defs)})"
+        )
+        conn.execute(
+            f"INSERT INTO ev_charging_stations_typed ({names}) "
+            f"SELECT {', '.join(select_exprs)} FROM ev_charging_stations_reduced"
+        )
+        conn.execute("DROP TABLE ev_charging_stations_reduced")
+        conn.execute(
+            "ALTER TABLE ev_charging_stations_typed "
+            "RENAME TO ev_charging_stations_reduced"
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for column, count in zip(stale, dropped):
+        if count:
+            logger.warning(
+                "%d non-numeric %s value(s) stored as NULL", count, column
+            )
+    return True
+
+
+# ==================== Station Rating Aggregates ====================
+
+# Each station carries rating_sum/rating_count over its user reviews, kept
+# current by triggers on the reviews table; avg_rating is generated from
+# them (see _AVG_RATING_EXPR). Listings, rating filters and detail pages
+# read these columns instead of aggregating reviews per request.
+RATING_TRIGGERS = (
+    'station_rating_review_ai', 'station_rating_review_ad',
+    'station_rating_review_au',
+)
+
+
+def _rating_sql() -> str:
+    def adjust(sign: str, ref: str) -> str:
+        return (
+            f"UPDATE ev_charging_stations_reduced SET "
+            f"rating_sum = COALESCE(rating_sum, 0) {sign} {ref}.rating, "
+            f"rating_count = COALESCE(rating_count, 0) {sign} 1 "
+            f"WHERE station_id = {ref}.station_id;"
+        )
+
+    return f"""
+CREATE TRIGGER IF NOT EXISTS station_rating_review_ai
+AFTER INSERT ON reviews BEGIN
+  {adjust('+', 'new')}
+END;
+CREATE TRIGGER IF NOT EXISTS station_rating_review_ad
+AFTER DELETE ON reviews BEGIN
+  {adjust('-', 'old')}
+END;
+CREATE TRIGGER IF NOT EXISTS station_rating_review_au
+AFTER UPDATE OF rating, station_id ON reviews BEGIN
+  {adjust('-', 'old')}
+  {adjust('+', 'new')}
+END;
+"""
+
+
+def _rating_aggregate_sql(table: str = 'ev_charging_stations_reduced') -> str:
+    return f"""UPDATE {table} SET
+             rating_sum = COALESCE((SELECT SUM(rating) FROM reviews r
+               WHERE r.station_id = {table}.station_id), 0),
+             rating_count = (SELECT COUNT(*) FROM reviews r
+               WHERE r.station_id = {table}.station_id)"""
+
+
+def rebuild_rating_aggregates(conn: sqlite3.Connection):
+    """Recompute every station's rating aggregates from the reviews table."""
+    conn.execute(_rating_aggregate_sql())
+    conn.commit()
+
+
+def ensure_rating_aggregates(conn: sqlite3.Connection, rebuild: bool = False):
+    """Create the aggregate triggers, recomputing the aggregates when asked
+    to or when any trigger was missing (new database, or the station table
+    was recreated by a migration)."""
+    existing = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'reviews'"
+        )
+    }
+    if existing.issuperset(RATING_TRIGGERS) and not rebuild:
+        return
+    conn.executescript(_rating_sql())
+    rebuild_rating_aggregates(conn)
+
+
+# ==================== Notification Counters ====================
+
+# notification_counters holds each user's unread count, kept in step with
+# the notifications table by triggers so every insert path (single,
+# fan-out, booking) and every read/unread change updates it in the same
+# transaction.
+NOTIFICATION_TRIGGERS = (
+    'notification_counter_ai', 'notification_counter_ad',
+    'notification_counter_au',
+)
+
+
+def _bump_unread(user: str, delta: int) -> str:
+    return (
+        f"INSERT INTO notification_counters (user_id, unread) "
+        f"VALUES ({user}, {delta}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET unread = unread + {delta};"
+    )
+
+
+NOTIFICATION_COUNTER_SQL = f"""
+CREATE TRIGGER IF NOT EXISTS notification_counter_ai
+AFTER INSERT ON notifications WHEN COALESCE(new.is_read, 0) = 0 BEGIN
+  {_bump_unread('new.user_id', 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS notification_counter_ad
+AFTER DELETE ON notifications WHEN COALESCE(old.is_read, 0) = 0 BEGIN
+  {_bump_unread('old.user_id', -1)}
+END;
+CREATE TRIGGER IF NOT EXISTS notification_counter_au
+AFTER UPDATE OF is_read, user_id ON notifications BEGIN
+  UPDATE notification_counters SET unread = unread - 1
+  WHERE user_id = old.user_id AND COALESCE(old.is_read, 0) = 0;
+  INSERT INTO notification_counters (user_id, unread)
+  SELECT new.user_id, 1 WHERE COALESCE(new.is_read, 0) = 0
+  ON CONFLICT(user_id) DO UPDATE SET unread = unread + 1;
+END;
+"""
+
+
+def rebuild_notification_counters(conn: sqlite3.Connection):
+    """Recompute every user's unread counter from the notifications table."""
+    conn.execute("DELETE FROM notification_counters")
+    conn.execute(
+        """INSERT INTO notification_counters (user_id, unread)
+           SELECT user_id, COUNT(*) FROM notifications
+           WHERE COALESCE(is_read, 0) = 0 GROUP BY user_id"""
+    )
+    conn.commit()
+
+
+def ensure_notification_counters(conn: sqlite3.Connection):
+    """Create the counter triggers, rebuilding the counters if any trigger
+    was missing (counts kept before then cannot be trusted)."""
+    existing = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'notifications'"
+        )
+    }
+    if existing.issuperset(NOTIFICATION_TRIGGERS):
+        return
+    conn.executescript(NOTIFICATION_COUNTER_SQL)
+    rebuild_notification_counters(conn)
+
+
+# ==================== Catalog Change Log ====================
+
+# catalog_change_log gets one entry per write to a table catalog-backed
+# pages show, whichever process makes it. kind is 'station' for a station
+# row, 'review' or 'comment' for page content the catalog frame does not
+# hold, and 'reload' for changes no trigger saw (a table swap, or
+# triggers that were missing). A StationCatalog applies the entries past
+# its position, re-reading only the stations they name, and its position
+# (the last seq applied) is the validator every worker shares.
+CATALOG_LOG_TABLES = {
+    'ev_charging_stations_reduced': 'station',
+    'reviews': 'review',
+    'comments': 'comment',
+}
+CATALOG_LOG_EVENTS = {'ai': 'INSERT', 'ad': 'DELETE', 'au': 'UPDATE'}
+CATALOG_LOG_TRIGGERS = tuple(
+    f"catalog_log_{kind}_{suffix}"
+    for kind in CATALOG_LOG_TABLES.values()
+    for suffix in CATALOG_LOG_EVENTS
+) + ('catalog_log_prune',)
+# Entries kept; a catalog further behind than this reloads in full.
+CATALOG_LOG_KEEP = 1000
+LOG_CATALOG_RELOAD_SQL = (
+    "INSERT INTO catalog_change_log (kind) VALUES ('reload')"
+)
+
+
+def _catalog_log_sql() -> str:
+    def log(ref: str, kind: str) -> str:
+        return (f"INSERT INTO catalog_change_log (station_id, kind) "
+                f"VALUES ({ref}.station_id, '{kind}');")
+
+    sql = ''
+    for table, kind in CATALOG_LOG_TABLES.items():
+        sql += f"""
+CREATE TRIGGER IF NOT EXISTS catalog_log_{kind}_ai
+AFTER INSERT ON {table} BEGIN
+  {log('new', kind)}
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_log_{kind}_ad
+AFTER DELETE ON {table} BEGIN
+  {log('old', kind)}
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_log_{kind}_au
+AFTER UPDATE ON {table} BEGIN
+  {log('new', kind)}
+  INSERT INTO catalog_change_log (station_id, kind)
+  SELECT old.station_id, '{kind}' WHERE old.station_id IS NOT new.station_id;
+END;"""
+    return sql + f"""
+CREATE TRIGGER IF NOT EXISTS catalog_log_prune
+AFTER INSERT ON catalog_change_log BEGIN
+  DELETE FROM catalog_change_log WHERE seq <= new.seq - {CATALOG_LOG_KEEP};
+END;
+"""
+
+
+def ensure_catalog_log(conn: sqlite3.Connection):
+    """Create the log triggers, logging a reload if any was missing (writes
+    made before then went unlogged). A new log starts at a random seq, so
+    validators handed out for an earlier database at the same path do not
+    match this one."""
+    existing = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE 'catalog_log_%'"
+        )
+    }
+    if existing.issuperset(CATALOG_LOG_TRIGGERS):
+        return
+    conn.executescript(_catalog_log_sql())
+    started = conn.execute(
+        "INSERT INTO catalog_change_log (seq, kind) "
+        "SELECT ABS(RANDOM() % 1000000000000) + 1, 'reload' "
+        "WHERE NOT EXISTS (SELECT 1 FROM catalog_change_log)"
+    ).rowcount
+    if not started:
+        conn.execute(LOG_CATALOG_RELOAD_SQL)
+    conn.commit()
+
+
+def _catalog_log_head(conn: sqlite3.Connection) -> Optional[int]:
+    return conn.execute("SELECT MAX(seq) FROM catalog_change_log").fetchone()[0]
+
+
+# ==================== Station Full-Text Search ====================
+
+SEARCH_COLUMNS = ['name', 'city', 'state', 'pincode', 'operator', 'nearby_landmark']
+# bm25 weights, in SEARCH_COLUMNS order: location fields rank above names
+SEARCH_WEIGHTS = [2.0, 5.0, 3.0, 5.0, 1.0, 1.0]
+
+
+def _search_sql() -> str:
+    cols = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old = ', '.join(f"old.{c}" for c in SEARCH_COLUMNS)
+    return f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS stations_fts USING fts5(
+  {cols},
+  content='ev_charging_stations_reduced', content_rowid='rowid',
+  tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS stations_fts_ai
+AFTER INSERT ON ev_charging_stations_reduced BEGIN
+  INSERT INTO stations_fts(rowid, {cols}) VALUES (new.rowid, {new});
+END;
+CREATE TRIGGER IF NOT EXISTS stations_fts_ad
+AFTER DELETE ON ev_charging_stations_reduced BEGIN
+  INSERT INTO stations_fts(stations_fts, rowid, {cols})
+  VALUES ('delete', old.rowid, {old});
+END;
+CREATE TRIGGER IF NOT EXISTS stations_fts_au
+AFTER UPDATE OF {cols} ON ev_charging_stations_reduced BEGIN
+  INSERT INTO stations_fts(stations_fts, rowid, {cols})
+  VALUES ('delete', old.rowid, {old});
+  INSERT INTO stations_fts(rowid, {cols}) VALUES (new.rowid, {new});
+END;
 """
 
 
-def get_conn():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    return sqlite3.connect(DB_PATH)
+def ensure_station_search(conn: sqlite3.Connection) -> bool:
+    """Create the FTS5 index and its sync triggers, rebuilding the index
+    whenever the triggers were missing (new database, or the station
+    table was recreated by a migration or import). Rowids of the station
+    table are not stable across VACUUM, so run rebuild_station_search()
+    after one. Returns False if this SQLite build lacks FTS5."""
+    triggers = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+        "AND tbl_name = 'ev_charging_stations_reduced' "
+        "AND name LIKE 'stations_fts_%'"
+    ))
+    # The update trigger used to fire on every column, re-indexing a
+    # station on rating or coordinate writes too.
+    if 'UPDATE OF' not in triggers.get('stations_fts_au', 'UPDATE OF'):
+        conn.execute("DROP TRIGGER stations_fts_au")
+        del triggers['stations_fts_au']
+    if len(triggers) == 3:
+        return True
+    try:
+        conn.executescript(_search_sql())
+    except sqlite3.OperationalError as e:
+        logger.warning("Full-text station search unavailable: %s", e)
+        return False
+    conn.execute("INSERT INTO stations_fts(stations_fts) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+
+def rebuild_station_search():
+    """Re-index every station in the full-text index."""
+    with get_conn() as conn:
+        conn.execute("INSERT INTO stations_fts(stations_fts) VALUES ('rebuild')")
+        conn.commit()
+
+
+def _fts_query(search_term: str) -> str:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"\w+", search_term)
+    return ' '.join(f'"{w}"*' for w in words)
 
 
 def init_db():
     with get_conn() as conn:
         conn.executescript(SCHEMA_SQL)
         conn.commit()
+        rebuilt = migrate_station_columns(conn)
+        added = ensure_columns(conn)
+        ensure_indexes(conn)
+        conn.commit()
+        ensure_station_search(conn)
+        ensure_rating_aggregates(conn, rebuild=any(
+            c.startswith('ev_charging_stations_reduced.') for c in added
+        ))
+        ensure_notification_counters(conn)
+        ensure_catalog_log(conn)
+        conn.execute("PRAGMA optimize")
+    if rebuilt:
+        station_catalog.invalidate()
 
 
 def import_sql_file(sql_path: str):
@@ -114,6 +1166,7 @@ def import_sql_file(sql_path: str):
     with get_conn() as conn:
         conn.executescript(sql)
         conn.commit()
+    station_catalog.invalidate()
 
 
 def list_distinct(column: str) -> List[str]:
@@ -130,7 +1183,24 @@ def list_distinct(column: str) -> List[str]:
     return [r[0] for r in rows]
 
 
-def as_dataframe(
+# ==================== Station Catalog Cache ====================
+
+CATALOG_TTL = float(os.environ.get("EV_CATALOG_TTL", "300"))
+# Listing order; station_id breaks ties so every row has a unique position
+STATION_ORDER = ['city', 'operator', 'name', 'station_id']
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+
+def _numeric_series(series: pd.Series) -> pd.Series:
+    # Typed columns arrive numeric already; coerce only untyped legacy data.
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
+
+def _station_mask(
+    df: pd.DataFrame,
     city: Optional[str] = None,
     operator: Optional[str] = None,
     status: Optional[str] = None,
@@ -139,69 +1209,834 @@ def as_dataframe(
     price_max: Optional[float] = None,
     rating_min: Optional[float] = None,
     rating_max: Optional[float] = None,
-) -> pd.DataFrame:
-    with get_conn() as conn:
-        sql = "SELECT * FROM ev_charging_stations_reduced WHERE 1=1"
-        params: List[Any] = []
-        if city:
-            sql += " AND city = ?"
-            params.append(city)
-        if operator:
-            sql += " AND operator = ?"
-            params.append(operator)
-        if status:
-            sql += " AND status = ?"
-            params.append(status)
-        if fast:
-            sql += " AND fast_charging_supported = ?"
-            params.append(fast)
-        sql += " ORDER BY city, operator, name"
-        df = pd.read_sql_query(sql, conn, params=params)
-
-    # Apply numeric filters in pandas with coercion
-    if (price_min is not None or price_max is not None) and (
-        'price_per_kWh_INR' in df.columns
-    ):
-        prices = pd.to_numeric(df['price_per_kWh_INR'], errors='coerce')
+) -> pd.Series:
+    """Boolean mask over ``df`` selecting stations that match the filters."""
+    mask = pd.Series(True, index=df.index)
+    if city:
+        mask &= df['city'] == city
+    if operator:
+        mask &= df['operator'] == operator
+    if status:
+        mask &= df['status'] == status
+    if fast:
+        mask &= df['fast_charging_supported'] == fast
+
+    if price_min is not None or price_max is not None:
+        prices = _numeric_series(df['price_per_kWh_INR'])
         if price_min is not None:
-            df = df[prices >= float(price_min)]
+            mask &= prices >= float(price_min)
         if price_max is not None:
-            df = df[prices <= float(price_max)]
+            mask &= prices <= float(price_max)
 
-    if (rating_min is not None or rating_max is not None) and (
-        'station_rating' in df.columns
-    ):
-        ratings = pd.to_numeric(df['station_rating'], errors='coerce')
+    if rating_min is not None or rating_max is not None:
+        ratings = _numeric_series(df['avg_rating'])
         if rating_min is not None:
-            df = df[ratings >= float(rating_min)]
+            mask &= ratings >= float(rating_min)
         if rating_max is not None:
-            df = df[ratings <= float(rating_max)]
-    return df
+            mask &= ratings <= float(rating_max)
+    return mask
+
+
+def _filter_stations(df: pd.DataFrame, **filters) -> pd.DataFrame:
+    mask = _station_mask(df, **filters)
+    return df if mask.all() else df[mask]
+
+
+# ==================== Spatial Index ====================
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+GRID_CELL_DEG = float(os.environ.get("EV_GRID_CELL_DEG", "0.25"))
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialGrid:
+    """Uniform latitude/longitude grid over station coordinates.
+
+    Row positions are bucketed by cell, so a k-nearest query only measures
+    the stations in the rings of cells around the query point and stops as
+    soon as no unvisited cell can hold anything closer. Stations without
+    coordinates are left out. Longitudes do not wrap at the antimeridian.
+    """
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray,
+                 cell_deg: float = GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        pos = np.flatnonzero(np.isfinite(self.lats) & np.isfinite(self.lngs))
+        self.size = len(pos)
+        if not self.size:
+            return
+        ci = np.floor(self.lats[pos] / cell_deg).astype(np.int64)
+        cj = np.floor(self.lngs[pos] / cell_deg).astype(np.int64)
+        keys, inverse = np.unique(
+            np.stack([ci, cj], axis=1), axis=0, return_inverse=True
+        )
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        groups = np.split(pos[order], np.cumsum(np.bincount(inverse))[:-1])
+        self.cells = {
+            (int(i), int(j)): g for (i, j), g in zip(keys, groups)
+        }
+        self.ci_range = (int(ci.min()), int(ci.max()))
+        self.cj_range = (int(cj.min()), int(cj.max()))
+
+    @staticmethod
+    def _ring(r: int):
+        if r == 0:
+            yield 0, 0
+            return
+        for d in range(-r, r + 1):
+            yield -r, d
+            yield r, d
+        for d in range(-r + 1, r):
+            yield d, -r
+            yield d, r
+
+    def nearest(self, lat: float, lng: float, k: int = 10,
+                radius_km: Optional[float] = None,
+                allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row positions, distances in km) of the k nearest stations,
+        closest first. ``allowed`` is an optional boolean array by row
+        position restricting the candidates."""
+        empty = (np.empty(0, dtype=np.int64), np.empty(0))
+        if not self.size or k <= 0:
+            return empty
+        ci0 = int(np.floor(lat / self.cell_deg))
+        cj0 = int(np.floor(lng / self.cell_deg))
+        max_ring = max(
+            abs(ci0 - self.ci_range[0]), abs(ci0 - self.ci_range[1]),
+            abs(cj0 - self.cj_range[0]), abs(cj0 - self.cj_range[1]),
+        )
+        found_pos: List[np.ndarray] = []
+        found_dist: List[np.ndarray] = []
+        count = 0
+        for r in range(max_ring + 1):
+            for di, dj in self._ring(r):
+                cand = self.cells.get((ci0 + di, cj0 + dj))
+                if cand is None:
+                    continue
+                if allowed is not None:
+                    cand = cand[allowed[cand]]
+                if len(cand):
+                    found_pos.append(cand)
+                    found_dist.append(haversine_km(
+                        lat, lng, self.lats[cand], self.lngs[cand]
+                    ))
+                    count += len(cand)
+            # Anything in an unvisited cell is at least r cells away.
+            edge_lat = min(89.9, abs(lat) + (r + 1) * self.cell_deg)
+            bound = r * self.cell_deg * KM_PER_DEGREE * np.cos(np.radians(edge_lat))
+            if radius_km is not None and bound > radius_km:
+                break
+            if count >= k and np.partition(
+                np.concatenate(found_dist), k - 1
+            )[k - 1] <= bound:
+                break
+        if not count:
+            return empty
+        pos = np.concatenate(found_pos)
+        dist = np.concatenate(found_dist)
+        if radius_km is not None:
+            keep = dist <= radius_km
+            pos, dist = pos[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')[:k]
+        return pos[order], dist[order]
+
+
+def _station_filter_sql(
+    city: Optional[str] = None,
+    operator: Optional[str] = None,
+    status: Optional[str] = None,
+    fast: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    rating_min: Optional[float] = None,
+    rating_max: Optional[float] = None,
+) -> Tuple[str, List[Any]]:
+    """WHERE clause (with leading space) and params for the station filters."""
+    sql = " WHERE 1=1"
+    params: List[Any] = []
+    if city:
+        sql += " AND city = ?"
+        params.append(city)
+    if operator:
+        sql += " AND operator = ?"
+        params.append(operator)
+    if status:
+        sql += " AND status = ?"
+        params.append(status)
+    if fast:
+        sql += " AND fast_charging_supported = ?"
+        params.append(fast)
+    if price_min is not None:
+        sql += " AND price_per_kWh_INR >= ?"
+        params.append(float(price_min))
+    if price_max is not None:
+        sql += " AND price_per_kWh_INR <= ?"
+        params.append(float(price_max))
+    if rating_min is not None:
+        sql += " AND avg_rating >= ?"
+        params.append(float(rating_min))
+    if rating_max is not None:
+        sql += " AND avg_rating <= ?"
+        params.append(float(rating_max))
+    return sql, params
+
+
+def query_stations(**filters) -> pd.DataFrame:
+    """Filtered station listing evaluated entirely in SQL.
+
+    Range predicates use the price/rating indexes, so the cost follows the
+    size of the result rather than the table.
+    """
+    where, params = _station_filter_sql(**filters)
+    order = " ORDER BY city, operator, name, station_id"
+    if any(filters.get(k) is not None for k in
+           ('price_min', 'price_max', 'rating_min', 'rating_max')):
+        # Without stat4 SQLite guesses a one-sided range matches a quarter
+        # of the table and prefers walking the listing index to skip the
+        # sort; the unary + keeps the range index in charge.
+        order = " ORDER BY +city, operator, name, station_id"
+    with get_conn() as conn:
+        return pd.read_sql_query(
+            "SELECT * FROM ev_charging_stations_reduced" + where + order,
+            conn, params=params,
+        )
 
 
-def upsert_station(row: Dict[str, Any]):
-    cols = [
-        'station_id', 'name', 'operator', 'state', 'city', 'pincode',
-        'charger_types', 'number_of_chargers', 'power_kW_each',
-        'price_per_kWh_INR', 'tariff_type', 'payment_methods', 'opening_hours',
-        'contact_number', 'email', 'station_rating', 'num_reviews',
-        'parking_spaces', 'amenities', 'reservation_supported',
-        'fast_charging_supported', 'nearby_landmark', 'uptime_percent',
-        'status'
-    ]
+def _listing_key(values) -> tuple:
+    # NULLs sort first, as in SQLite and in pandas with na_position='first'
+    return tuple((0, '') if pd.isna(v) else (1, str(v)) for v in values)
+
+
+def _encode_cursor(key: tuple) -> str:
+    raw = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Optional[tuple]:
+    """Inverse of _encode_cursor; None for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = tuple((int(flag), str(text)) for flag, text in json.loads(raw))
+    except (ValueError, TypeError):
+        return None
+    return key if len(key) == len(STATION_ORDER) else None
+
+
+# ---------- Facets ----------
+
+# Listing filter -> column whose values (with counts) fill its dropdown.
+FACETS = {
+    'city': 'city',
+    'operator': 'operator',
+    'status': 'status',
+    'fast': 'fast_charging_supported',
+}
+RANGE_FILTERS = ('price_min', 'price_max', 'rating_min', 'rating_max')
+# Filter selections whose facet counts each catalog version remembers.
+FACET_CACHE_SIZE = 256
+
+
+class FacetIndex:
+    """Facet values of a station frame, grouped into the distinct
+    combinations of (city, operator, status, fast) that occur.
+
+    Counting then works on the combinations, of which there are far fewer
+    than stations. One bincount over the stations passing the range
+    filters yields every combination's size. Each facet is then summed from
+    the combinations matching the *other* selected facets, so a dropdown
+    keeps showing the alternatives to its own selection. ``weights`` lets
+    a frame of pre-aggregated combinations stand in for the stations.
+    """
+
+    def __init__(self, df: pd.DataFrame, weights: Optional[pd.Series] = None):
+        self.values: Dict[str, list] = {}
+        self._positions: Dict[str, Dict[Any, int]] = {}
+        codes = []
+        for name, column in FACETS.items():
+            # Blank values are left out of the dropdowns, as NULLs are.
+            col = df[column].mask(df[column] == '')
+            col_codes, uniques = pd.factorize(col, sort=True)
+            self.values[name] = uniques.tolist()
+            self._positions[name] = {v: i for i, v in enumerate(self.values[name])}
+            codes.append(col_codes)
+        # Pack each row's codes (shifted so "missing" is 0) into one int64;
+        # a 1-D unique is far cheaper than a row-wise one.
+        dims = tuple(len(v) + 1 for v in self.values.values())
+        packed = np.ravel_multi_index([c + 1 for c in codes], dims)
+        keys, inverse = np.unique(packed, return_inverse=True)
+        self.combos = np.stack(np.unravel_index(keys, dims), axis=1) - 1
+        self.row_combo = inverse.reshape(-1)
+        self.sizes = np.bincount(
+            self.row_combo, minlength=len(self.combos),
+            weights=None if weights is None else weights.to_numpy(dtype=float),
+        )
+
+    def counts(self, rows: Optional[np.ndarray] = None,
+               **filters) -> Dict[str, List[Tuple[Any, int]]]:
+        """``(value, count)`` pairs per facet, in value order. ``rows`` is
+        a boolean mask of the stations passing the non-facet filters."""
+        sizes = self.sizes if rows is None else np.bincount(
+            self.row_combo[rows], minlength=len(self.combos)
+        )
+        matches = {
+            i: self.combos[:, i] == self._positions[name].get(filters[name], -2)
+            for i, name in enumerate(FACETS) if filters.get(name)
+        }
+        result = {}
+        for i, name in enumerate(FACETS):
+            keep = self.combos[:, i] >= 0
+            for j, match in matches.items():
+                if j != i:
+                    keep &= match
+            totals = np.bincount(self.combos[keep, i], weights=sizes[keep],
+                                 minlength=len(self.values[name]))
+            result[name] = list(zip(self.values[name], totals.astype(int).tolist()))
+        return result
+
+
+def _facet_counts_sql(**filters) -> Dict[str, List[Tuple[Any, int]]]:
+    """FacetIndex.counts for an uncached catalog: one grouped pass in SQL
+    over the facet columns, with the range filters folded into the count
+    so values they exclude still come back with 0."""
+    where, params = _station_filter_sql(
+        **{k: filters.get(k) for k in RANGE_FILTERS}
+    )
+    columns = ', '.join(FACETS.values())
+    with get_conn() as conn:
+        combos = pd.read_sql_query(
+            f"SELECT {columns}, "
+            f"SUM(CASE WHEN {where[len(' WHERE '):]} THEN 1 ELSE 0 END) AS n "
+            f"FROM ev_charging_stations_reduced GROUP BY {columns}",
+            conn, params=params,
+        )
+    return FacetIndex(combos, weights=combos['n']).counts(**filters)
+
+
+# ---------- Analytics ----------
+
+ANALYTICS_TOP_N = 15
+
+
+def _series(values: pd.Series, top: Optional[int] = ANALYTICS_TOP_N,
+            digits: Optional[int] = None) -> Dict[str, list]:
+    """Largest-first chart series ({'labels', 'values'}) from a grouped
+    Series."""
+    values = values.sort_values(ascending=False, kind='mergesort')
+    if top:
+        values = values.head(top)
+    if digits is not None:
+        values = values.round(digits)
+    return {'labels': [str(k) for k in values.index],
+            'values': values.tolist()}
+
+
+def _summarize_stations(df: pd.DataFrame) -> Dict[str, Any]:
+    """Per-city counts and average price, and operator/status counts."""
+    keys = lambda col: df[col].fillna('Unknown').replace('', 'Unknown')
+    price = _numeric_series(df['price_per_kWh_INR'])
+    by_city = price.groupby(keys('city'))
+    return {
+        'total': int(len(df)),
+        'city_counts': _series(by_city.size()),
+        'price_by_city': _series(by_city.mean().dropna(), digits=2),
+        'operator_counts': _series(keys('operator').value_counts()),
+        'status_counts': _series(keys('status').value_counts(), top=None),
+    }
+
+
+def _same_value(a, b) -> bool:
+    if pd.isna(a) or pd.isna(b):
+        return bool(pd.isna(a) and pd.isna(b))
+    return bool(a == b)
+
+
+# Columns read by the catalog's derived structures. An in-place row
+# update rebuilds only the structures whose columns it changed.
+GRID_COLUMNS = {'latitude', 'longitude'}
+SUMMARY_COLUMNS = {'city', 'operator', 'status', 'price_per_kWh_INR'}
+FACET_RANGE_COLUMNS = {'price_per_kWh_INR', 'avg_rating'}
+# Stations a sync re-reads one by one; a burst naming more reloads the table.
+CATALOG_PATCH_LIMIT = 200
+
+
+class StationCatalog:
+    """In-process copy of the station table.
+
+    The table is loaded once and kept sorted by STATION_ORDER; filtered
+    views are computed from memory. A sync applies the catalog_change_log
+    entries written since the last one, re-reading just the stations they
+    name, and reloads the whole table only for a logged reload or a burst
+    of more than CATALOG_PATCH_LIMIT stations. Writes made through this
+    module sync straight away; those made by other processes are picked
+    up by the first read after the TTL runs out. A TTL of 0 disables
+    caching and sends every query to SQL.
+    Returned frames are shared and must be treated as read-only; the
+    catalog never modifies a frame it has handed out.
+
+    ``revision`` is the seq of the last log entry applied. Every process
+    at the same revision shows the same pages, so it backs HTTP
+    validators.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.revision: Optional[int] = None
+        self._df: Optional[pd.DataFrame] = None
+        self._loaded_at = 0.0
+        self._path: Optional[Path] = None
+        self._grid: Optional[SpatialGrid] = None
+        self._grid_version = -1
+        self._keys: List[tuple] = []
+        self._keys_version = -1
+        self._summary: Optional[Dict[str, Any]] = None
+        self._summary_version = -1
+        self._facets: Optional[FacetIndex] = None
+        self._facet_cache: Dict[tuple, Dict[str, list]] = {}
+        self._facets_version = -1
+        self._lock = threading.RLock()
+
+    def _sorted(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.sort_values(
+            STATION_ORDER, kind='mergesort', na_position='first'
+        ).reset_index(drop=True)
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._df is not None
+            and self.ttl > 0
+            and self._path == Path(DB_PATH)
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def frame(self) -> pd.DataFrame:
+        """Return the full station table, loading it on a miss."""
+        with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._df
+            if self._df is not None and self.ttl > 0:
+                if not self._sync():
+                    self.hits += 1
+                return self._df
+            with get_conn() as conn:
+                conn.execute("BEGIN")
+                return self._load(conn)
+
+    def _load(self, conn: sqlite3.Connection) -> pd.DataFrame:
+        """Read the whole table and the log position it reflects (call
+        under lock, inside a read transaction on ``conn``)."""
+        self.misses += 1
+        df = pd.read_sql_query(
+            "SELECT * FROM ev_charging_stations_reduced "
+            "ORDER BY city, operator, name, station_id",
+            conn,
+        )
+        self.revision = _catalog_log_head(conn)
+        self._df = df
+        self._path = Path(DB_PATH)
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        return df
+
+    def _sync(self) -> bool:
+        """Apply the log entries past ``revision`` (call under lock). The
+        log and the rows are read in one transaction, so the frame matches
+        the revision it ends at. True if that took a full reload."""
+        with get_conn() as conn:
+            conn.execute("BEGIN")
+            if self._df is None:
+                # Nothing cached to patch, only the position to move.
+                self.revision = _catalog_log_head(conn)
+                self._loaded_at = time.monotonic()
+                return False
+            if self.revision is None or self._path != Path(DB_PATH):
+                self._load(conn)
+                return True
+            entries = conn.execute(
+                "SELECT seq, station_id, kind FROM catalog_change_log "
+                "WHERE seq > ? ORDER BY seq", (self.revision,)
+            ).fetchall()
+            ids = {sid for _, sid, kind in entries if kind == 'station'}
+            # A gap means entries were pruned before this catalog saw them.
+            if entries and (entries[0][0] != self.revision + 1
+                            or len(ids) > CATALOG_PATCH_LIMIT
+                            or any(kind == 'reload' for _, _, kind in entries)):
+                self._load(conn)
+                return True
+            if ids:
+                rows = pd.read_sql_query(
+                    "SELECT * FROM ev_charging_stations_reduced "
+                    f"WHERE station_id IN ({','.join(['?'] * len(ids))})",
+                    conn, params=list(ids),
+                )
+                self._apply_rows(ids, rows)
+            if entries:
+                self.revision = entries[-1][0]
+            self._loaded_at = time.monotonic()
+            return False
+
+    def _apply_rows(self, ids: set, rows: pd.DataFrame):
+        """Bring the cached copies of the stations in ``ids`` in line with
+        ``rows``, their database copies (call under lock). A change that
+        leaves a station's STATION_ORDER key alone, such as a new rating,
+        is patched into its row; new, moved and deleted stations re-sort
+        the frame once and start a new version."""
+        moved = [row['station_id'] for _, row in rows.iterrows()
+                 if not self._patch_row(row)]
+        drop = set(moved) | (ids - set(rows['station_id']))
+        if not drop:
+            return
+        self.version += 1
+        df = self._df[~self._df['station_id'].isin(drop)]
+        if moved:
+            new = rows[rows['station_id'].isin(moved)].copy()
+            # A column that is all NULL in the re-read rows arrives as
+            # object and would drag the cached column down with it. NULLs
+            # in an integer column turn it float, as a full load would.
+            for c in new.columns:
+                dtype = df[c].dtype
+                if pd.api.types.is_integer_dtype(dtype) and new[c].isna().any():
+                    dtype = 'float64'
+                try:
+                    new[c] = new[c].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+            self._df = self._sorted(pd.concat([df, new], ignore_index=True))
+        else:
+            self._df = df.reset_index(drop=True)
+
+    def query(self, **filters) -> pd.DataFrame:
+        """Filtered view of the catalog; see as_dataframe for the filters.
+
+        With caching disabled the filters are pushed down to SQL instead.
+        """
+        if self.ttl <= 0:
+            with self._lock:
+                self.misses += 1
+            return query_stations(**filters)
+        return _filter_stations(self.frame(), **filters)
+
+    def nearest(self, lat: float, lng: float, k: int = 10,
+                radius_km: Optional[float] = None, **filters) -> pd.DataFrame:
+        """The k stations closest to (lat, lng) that match the filters,
+        closest first, with a ``distance_km`` column."""
+        with self._lock:
+            df = self.frame()
+            if self._grid is None or self._grid_version != self.version:
+                self._grid = SpatialGrid(
+                    df['latitude'].to_numpy(dtype=float, na_value=np.nan),
+                    df['longitude'].to_numpy(dtype=float, na_value=np.nan),
+                )
+                self._grid_version = self.version
+            grid = self._grid
+        allowed = None
+        if any(filters.values()):
+            allowed = _station_mask(df, **filters).to_numpy()
+        pos, dist = grid.nearest(lat, lng, k, radius_km, allowed)
+        result = df.iloc[pos].reset_index(drop=True)
+        result['distance_km'] = np.round(dist, 2)
+        return result
+
+    def _listing_keys(self, df: pd.DataFrame) -> List[tuple]:
+        """Sort keys of every cached row, in frame order (call under lock)."""
+        if self._keys_version != self.version:
+            self._keys = [
+                _listing_key(values)
+                for values in zip(*(df[c] for c in STATION_ORDER))
+            ]
+            self._keys_version = self.version
+        return self._keys
+
+    def page(self, after: Optional[str] = None, page_size: int = PAGE_SIZE,
+             **filters) -> Dict[str, Any]:
+        """One page of the filtered listing in STATION_ORDER.
+
+        ``after`` is the cursor returned with the previous page; the next
+        page starts at the first row sorting after that row's key, so
+        inserts and deletes between requests never skip or repeat rows.
+        Returns ``rows``, ``total`` (matching rows) and ``next`` (cursor
+        for the following page, or None on the last page).
+        """
+        page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+        with self._lock:
+            df = self.frame()
+            keys = self._listing_keys(df)
+        positions = np.flatnonzero(_station_mask(df, **filters).to_numpy())
+        start = 0
+        key = _decode_cursor(after) if after else None
+        if key is not None:
+            start = int(np.searchsorted(
+                positions, bisect.bisect_right(keys, key)
+            ))
+        chosen = positions[start:start + page_size]
+        next_cursor = None
+        if start + page_size < len(positions):
+            next_cursor = _encode_cursor(keys[chosen[-1]])
+        return {
+            'rows': df.iloc[chosen].reset_index(drop=True),
+            'total': len(positions),
+            'next': next_cursor,
+        }
+
+    def facets(self, **filters) -> Dict[str, List[Tuple[Any, int]]]:
+        """Every value of each FACETS column, in order, with the number of
+        stations it would match combined with the other active filters.
+
+        Results are cached per filter selection until the catalog version
+        changes, so any write through this module invalidates them. With
+        caching disabled the counts come from one SQL pass instead.
+        """
+        if self.ttl <= 0:
+            return _facet_counts_sql(**filters)
+        key = tuple((k, filters.get(k)) for k in (*FACETS, *RANGE_FILTERS))
+        with self._lock:
+            df = self.frame()
+            if self._facets_version != self.version:
+                self._facets = FacetIndex(df)
+                self._facet_cache = {}
+                self._facets_version = self.version
+            cache = self._facet_cache
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            index = self._facets
+        rows = None
+        if any(filters.get(k) is not None for k in RANGE_FILTERS):
+            rows = _station_mask(
+                df, **{k: filters.get(k) for k in RANGE_FILTERS}
+            ).to_numpy()
+        result = index.counts(rows, **filters)
+        with self._lock:
+            # A write since the lookup replaced the cache; drop the result.
+            if self._facet_cache is cache:
+                if len(cache) >= FACET_CACHE_SIZE:
+                    cache.pop(next(iter(cache)))
+                cache[key] = result
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """Chart series for the analytics dashboard, recomputed only when
+        the catalog version changes."""
+        with self._lock:
+            df = self.frame()
+            if self._summary_version != self.version:
+                self._summary = _summarize_stations(df)
+                self._summary_version = self.version
+            return self._summary
+
+    def current_revision(self) -> Optional[int]:
+        """``revision``, syncing first if the TTL has run out since the last
+        sync. Otherwise touches no database. None when caching is
+        disabled, as then nothing tracks changes."""
+        with self._lock:
+            if self.ttl <= 0:
+                return None
+            if (self.revision is None
+                    or time.monotonic() - self._loaded_at >= self.ttl):
+                self._sync()
+            return self.revision
+
+    def sync(self):
+        """Apply logged changes now, so a write made through this module
+        shows on the next read."""
+        with self._lock:
+            if self.ttl > 0:
+                self._sync()
+
+    def _patch_row(self, new: pd.Series) -> bool:
+        """Swap in a frame holding ``new`` as the station's row if its sort
+        key is unchanged, dropping only the derived structures that read a
+        changed column (call under lock). False when the row has to move or
+        the values do not fit the cached dtypes.
+
+        Readers may still hold the old frame, so it is left as it was: the
+        new one is a shallow copy, which copy-on-write splits from the old
+        only in the columns written."""
+        keys = self._listing_keys(self._df)
+        key = _listing_key(new[STATION_ORDER])
+        pos = bisect.bisect_left(keys, key)
+        # The key ends in station_id, so a match is this station's row.
+        if pos == len(keys) or keys[pos] != key or list(new.index) != list(self._df.columns):
+            return False
+        df = self._df.copy(deep=False)
+        old = df.iloc[pos]
+        changed = {c for c in df.columns if not _same_value(old[c], new[c])}
+        try:
+            for c in changed:
+                df.iloc[pos, df.columns.get_loc(c)] = new[c]
+        except (TypeError, ValueError):
+            # The fallback rebuilds the row from the database copy.
+            return False
+        self._df = df
+        if changed & GRID_COLUMNS:
+            self._grid_version = -1
+        if changed & SUMMARY_COLUMNS:
+            self._summary_version = -1
+        if changed & set(FACETS.values()):
+            self._facets_version = -1
+        if changed & (set(FACETS.values()) | FACET_RANGE_COLUMNS):
+            self._facet_cache = {}
+        return True
+
+    def invalidate(self):
+        """Force a full reload on the next read."""
+        with self._lock:
+            self.version += 1
+            self._df = None
+            self._loaded_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'version': self.version,
+                'revision': self.revision,
+                'rows': 0 if self._df is None else len(self._df),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1)
+                if self._df is not None else None,
+                'ttl': self.ttl,
+            }
+
+
+station_catalog = StationCatalog()
+
+
+def as_dataframe(
+    city: Optional[str] = None,
+    operator: Optional[str] = None,
+    status: Optional[str] = None,
+    fast: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    rating_min: Optional[float] = None,
+    rating_max: Optional[float] = None,
+) -> pd.DataFrame:
+    return station_catalog.query(
+        city=city, operator=operator, status=status, fast=fast,
+        price_min=price_min, price_max=price_max,
+        rating_min=rating_min, rating_max=rating_max,
+    )
+
+
+def list_stations_page(after: Optional[str] = None, page_size: int = PAGE_SIZE,
+                       **filters) -> Dict[str, Any]:
+    """Keyset-paginated station listing; see StationCatalog.page."""
+    return station_catalog.page(after, page_size, **filters)
+
+
+def station_facets(**filters) -> Dict[str, List[Tuple[Any, int]]]:
+    """Filter dropdown values with counts for the listing filters; see
+    StationCatalog.facets."""
+    return station_catalog.facets(**filters)
+
+
+def catalog_stats() -> Dict[str, Any]:
+    """Hit/miss counts, version and size of the in-memory station catalog."""
+    return station_catalog.stats()
+
+
+def catalog_revision() -> Optional[str]:
+    """Opaque token that changes whenever catalog-backed pages may change,
+    the same in every process, or None when the catalog cache is
+    disabled. Usually answered from memory; see
+    StationCatalog.current_revision."""
+    revision = station_catalog.current_revision()
+    return None if revision is None else str(revision)
+
+
+def station_summary() -> Dict[str, Any]:
+    """Aggregated chart series for /analytics; see _summarize_stations."""
+    return station_catalog.summary()
+
+
+def nearest_stations(lat: float, lng: float, k: int = 10,
+                     radius_km: Optional[float] = None, **filters) -> pd.DataFrame:
+    """k nearest stations to a point, optionally within radius_km and
+    narrowed by the as_dataframe filters."""
+    return station_catalog.nearest(lat, lng, k, radius_km, **filters)
+
+
+# Columns written by upsert_station and delta imports.
+STATION_UPSERT_COLUMNS = [
+    'station_id', 'name', 'operator', 'state', 'city', 'pincode',
+    'charger_types', 'number_of_chargers', 'power_kW_each',
+    'price_per_kWh_INR', 'tariff_type', 'payment_methods', 'opening_hours',
+    'contact_number', 'email', 'station_rating', 'num_reviews',
+    'parking_spaces', 'amenities', 'reservation_supported',
+    'fast_charging_supported', 'nearby_landmark', 'uptime_percent',
+    'status'
+]
+
+
+def _upsert_station_sql(cols: List[str] = STATION_UPSERT_COLUMNS) -> str:
     placeholders = ','.join(['?'] * len(cols))
     assignments = ','.join([
         f"{c}=excluded.{c}" for c in cols if c != 'station_id'
     ])
-    values = [row.get(c) for c in cols]
-    sql = (
+    return (
         f"INSERT INTO ev_charging_stations_reduced ("
         f"{','.join(cols)}) VALUES ({placeholders}) "
         f"ON CONFLICT(station_id) DO UPDATE SET {assignments}"
     )
+
+
+def _notify_status_change(conn: sqlite3.Connection, station_id: str,
+                          name: str, status: str) -> Tuple[int, Optional[str]]:
+    """Notify a station's bookmark holders of its new status inside the
+    caller's transaction, or hand back the message for a background
+    fan-out when the audience is large. Returns (audience, message)."""
+    message = f"{name or station_id} is now {status}"
+    audience = _bookmark_holder_count(conn, station_id)
+    if audience <= FANOUT_SYNC_LIMIT:
+        _fan_out_batch(conn, station_id, message)
+        return audience, None
+    return audience, message
+
+
+def upsert_station(row: Dict[str, Any]) -> int:
+    """Insert or update a station.
+
+    When an existing station's status changes, everyone who bookmarked it
+    is notified; returns the number of users notified (or being notified
+    in the background for large audiences).
+    """
+    values = [row.get(c) for c in STATION_UPSERT_COLUMNS]
+    station_id = row.get('station_id')
+    notified, background = 0, None
     with get_conn() as conn:
-        conn.execute(sql, values)
+        conn.execute("BEGIN IMMEDIATE")
+        previous = conn.execute(
+            "SELECT name, status FROM ev_charging_stations_reduced "
+            "WHERE station_id = ?", (station_id,)
+        ).fetchone()
+        conn.execute(_upsert_station_sql(), values)
+        if previous and previous[1] != row.get('status'):
+            notified, background = _notify_status_change(
+                conn, station_id, row.get('name') or previous[0],
+                row.get('status'),
+            )
         conn.commit()
+    if background:
+        _fan_out_in_background(station_id, background)
+    station_catalog.sync()
+    return notified
 
 
 def delete_station(station_id: str):
@@ -211,6 +2046,498 @@ def delete_station(station_id: str):
             (station_id,),
         )
         conn.commit()
+    station_catalog.sync()
+
+
+# ==================== Bulk Station Import ====================
+
+STATION_STAGING_TABLE = 'ev_charging_stations_staging'
+IMPORT_BATCH_SIZE = 5000
+# Columns a full import loads; aggregates and generated columns are derived.
+STATION_IMPORT_COLUMNS = STATION_UPSERT_COLUMNS + ['latitude', 'longitude']
+_IMPORT_NUMERIC_COLUMNS = {
+    **STATION_NUMERIC_COLUMNS, 'latitude': 'REAL', 'longitude': 'REAL',
+}
+
+
+def _coerce_station_value(column: str, value: Any) -> Any:
+    """Feed value -> stored value. Blanks become NULL and numeric columns
+    are parsed, with unparseable numbers stored as NULL (as the typed
+    column migration does)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    kind = _IMPORT_NUMERIC_COLUMNS.get(column)
+    if kind is None:
+        return value if isinstance(value, str) else str(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number != number:
+        return None
+    if kind == 'INTEGER' and number.is_integer():
+        return int(number)
+    return number
+
+
+def _station_batches(rows: Iterable[Dict[str, Any]], columns: List[str],
+                     batch_size: int, stats: Dict[str, Any],
+                     present_only: bool = False) -> Iterator[Tuple[List[str], list]]:
+    """Group feed rows into (columns, value tuples) batches, skipping rows
+    without a station_id. With ``present_only`` each row only carries the
+    ``columns`` it actually has, and a batch ends whenever that set
+    changes."""
+    batch: list = []
+    batch_columns = columns
+    for row in rows:
+        stats['read'] += 1
+        row_columns = (
+            [c for c in columns if c in row] if present_only else columns
+        )
+        values = tuple(_coerce_station_value(c, row.get(c)) for c in row_columns)
+        if not values or row_columns[0] != 'station_id' or values[0] is None:
+            stats['skipped'] += 1
+            continue
+        if batch and (len(batch) >= batch_size or row_columns != batch_columns):
+            yield batch_columns, batch
+            batch = []
+        batch_columns = row_columns
+        batch.append(values)
+    if batch:
+        yield batch_columns, batch
+
+
+def _execute_script(conn: sqlite3.Connection, script: str):
+    """Run a multi-statement script inside the current transaction
+    (executescript would commit it first)."""
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                conn.execute(statement)
+            statement = ''
+
+
+def _create_staging_table(conn: sqlite3.Connection):
+    """Empty copy of the live station table, same columns and keys."""
+    ddl = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' "
+        "AND name = 'ev_charging_stations_reduced'"
+    ).fetchone()[0]
+    conn.execute(f"DROP TABLE IF EXISTS {STATION_STAGING_TABLE}")
+    conn.execute(re.sub(
+        r'^CREATE TABLE\s+"?ev_charging_stations_reduced"?',
+        f'CREATE TABLE {STATION_STAGING_TABLE}', ddl, count=1,
+    ))
+    conn.commit()
+
+
+def _swap_in_staging_table(conn: sqlite3.Connection):
+    """Replace the live station table with the staging table in a single
+    transaction, carrying over rating aggregates, indexes, triggers and
+    the search index. Readers see the old table until it commits."""
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'stations_fts'"
+    ).fetchone()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(_rating_aggregate_sql(STATION_STAGING_TABLE))
+        for trigger in RATING_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE ev_charging_stations_reduced")
+        conn.execute(
+            f"ALTER TABLE {STATION_STAGING_TABLE} "
+            "RENAME TO ev_charging_stations_reduced"
+        )
+        ensure_indexes(conn)
+        _execute_script(conn, _rating_sql())
+        # The station triggers went with the old table, and dropping a
+        # table fires none, so the swap is logged as a reload.
+        _execute_script(conn, _catalog_log_sql())
+        conn.execute(LOG_CATALOG_RELOAD_SQL)
+        if has_fts:
+            _execute_script(conn, _search_sql())
+            conn.execute(
+                "INSERT INTO stations_fts(stations_fts) VALUES ('rebuild')"
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _upsert_station_batch(conn: sqlite3.Connection, columns: List[str],
+                          batch: list) -> int:
+    """Upsert one batch of value tuples in a transaction, notifying
+    bookmark holders of status changes. Returns users notified."""
+    name_at = columns.index('name') if 'name' in columns else None
+    status_at = columns.index('status') if 'status' in columns else None
+    ids = [values[0] for values in batch]
+    conn.execute("BEGIN IMMEDIATE")
+    previous: Dict[str, Any] = {}
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        previous.update(conn.execute(
+            "SELECT station_id, status FROM ev_charging_stations_reduced "
+            f"WHERE station_id IN ({','.join(['?'] * len(part))})", part
+        ).fetchall())
+    conn.executemany(_upsert_station_sql(columns), batch)
+    notified, background = 0, []
+    for values in batch:
+        station_id = values[0]
+        if status_at is None:
+            break
+        if station_id in previous and previous[station_id] != values[status_at]:
+            previous[station_id] = values[status_at]
+            audience, message = _notify_status_change(
+                conn, station_id,
+                values[name_at] if name_at is not None else None,
+                values[status_at],
+            )
+            notified += audience
+            if message:
+                background.append((station_id, message))
+    conn.commit()
+    for station_id, message in background:
+        _fan_out_in_background(station_id, message)
+    return notified
+
+
+def bulk_load_stations(rows: Iterable[Dict[str, Any]], delta: bool = False,
+                       batch_size: int = IMPORT_BATCH_SIZE,
+                       progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                       ) -> Dict[str, Any]:
+    """Stream station rows (dicts keyed by column name) into the database.
+
+    A full import loads batches into a staging table, one transaction
+    each, then swaps it in atomically, so the live table stays complete
+    and readable for the whole run. A delta import upserts each batch
+    through the upsert_station column list and leaves other stations
+    alone; columns a feed row does not mention keep their current value.
+    ``progress`` is called with the running stats after every
+    batch. Returns read/loaded/skipped counts, elapsed time and rows/sec.
+    """
+    stats: Dict[str, Any] = {
+        'mode': 'delta' if delta else 'full',
+        'read': 0, 'loaded': 0, 'skipped': 0, 'notified': 0,
+    }
+    began = time.perf_counter()
+
+    def timed() -> Dict[str, Any]:
+        elapsed = time.perf_counter() - began
+        stats['elapsed_s'] = round(elapsed, 2)
+        stats['rows_per_sec'] = round(stats['loaded'] / elapsed) if elapsed else 0
+        return stats
+
+    columns = STATION_UPSERT_COLUMNS if delta else STATION_IMPORT_COLUMNS
+    insert = (
+        f"INSERT OR REPLACE INTO {STATION_STAGING_TABLE} "
+        f"({','.join(columns)}) VALUES ({','.join(['?'] * len(columns))})"
+    )
+    with get_conn() as conn:
+        if not delta:
+            _create_staging_table(conn)
+        try:
+            for batch_columns, batch in _station_batches(
+                    rows, columns, batch_size, stats, present_only=delta):
+                if delta:
+                    stats['notified'] += _upsert_station_batch(
+                        conn, batch_columns, batch)
+                else:
+                    conn.executemany(insert, batch)
+                    conn.commit()
+                stats['loaded'] += len(batch)
+                if progress:
+                    progress(timed())
+            if not delta:
+                if not stats['loaded']:
+                    raise ValueError("feed contained no stations; "
+                                     "keeping the current table")
+                _swap_in_staging_table(conn)
+        finally:
+            if not delta:
+                conn.execute(f"DROP TABLE IF EXISTS {STATION_STAGING_TABLE}")
+                conn.commit()
+    station_catalog.invalidate()
+    return timed()
+
+
+# ==================== Station Geocoding ====================
+
+# Coordinates come from local gazetteer CSVs: a pincode directory (one row
+# per post office with pincode, latitude, longitude) and/or city centroids
+# (city, state, latitude, longitude, no pincode). Each station is matched
+# on the most precise place key available, in GEOCODE_LEVELS order.
+GEOCODE_LEVELS = ['pincode', 'city', 'district', 'town']
+GAZETTEER_COLUMNS = {
+    'pincode': ('pincode', 'pin', 'pin_code', 'postal_code'),
+    'city': ('city', 'district', 'districtname', 'town'),
+    'state': ('state', 'statename', 'state_name'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'lon', 'long'),
+}
+# Old and alternate spellings, after _normalize_place.
+CITY_ALIASES = {
+    'bangalore': 'bengaluru', 'bangalore urban': 'bengaluru',
+    'bombay': 'mumbai', 'calcutta': 'kolkata', 'madras': 'chennai',
+    'gurgaon': 'gurugram', 'mysore': 'mysuru', 'poona': 'pune',
+    'delhi': 'new delhi', 'trivandrum': 'thiruvananthapuram',
+    'cochin': 'kochi', 'vizag': 'visakhapatnam',
+}
+GEOCODE_WRITE_BATCH = 10000
+
+
+def _normalize_place(values: pd.Series) -> pd.Series:
+    return (
+        values.astype('string').str.lower()
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+        .replace(CITY_ALIASES)
+    )
+
+
+def _place_keys(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Candidate gazetteer keys per row for every GEOCODE_LEVELS level
+    (NA where the row lacks the field). ``district`` is the pincode's
+    three-digit sorting district; ``town`` is the city without a state."""
+    pin = df['pincode'].astype('string').str.extract(r'(\d{6})', expand=False)
+    city = _normalize_place(df['city']).replace('', pd.NA)
+    state = _normalize_place(df['state']).fillna('')
+    return {
+        'pincode': 'pincode:' + pin,
+        'city': 'city:' + city + '|' + state,
+        'district': 'district:' + pin.str[:3],
+        'town': 'town:' + city,
+    }
+
+
+def load_gazetteer(paths: Iterable[Any]) -> pd.DataFrame:
+    """Concatenate gazetteer CSVs into one pincode/city/state/latitude/
+    longitude frame, mapping common header spellings (see
+    GAZETTEER_COLUMNS) and dropping rows without usable coordinates."""
+    frames = []
+    for path in paths:
+        raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+        headers = {c.strip().lower(): c for c in raw.columns}
+        frame = pd.DataFrame(index=raw.index)
+        for column, names in GAZETTEER_COLUMNS.items():
+            source = next((headers[n] for n in names if n in headers), None)
+            frame[column] = raw[source] if source else ''
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=list(GAZETTEER_COLUMNS))
+    gazetteer = pd.concat(frames, ignore_index=True)
+    for column in ('latitude', 'longitude'):
+        gazetteer[column] = pd.to_numeric(gazetteer[column], errors='coerce')
+    valid = (
+        gazetteer['latitude'].between(-90, 90)
+        & gazetteer['longitude'].between(-180, 180)
+        & ~((gazetteer['latitude'] == 0) & (gazetteer['longitude'] == 0))
+    )
+    return gazetteer[valid].reset_index(drop=True)
+
+
+def _gazetteer_places(gazetteer: pd.DataFrame) -> pd.DataFrame:
+    """Gazetteer -> one averaged coordinate per place key. City keys prefer
+    explicit centroid rows (no pincode) over averaging post offices."""
+    keys = _place_keys(gazetteer)
+    has_pin = keys['pincode'].notna()
+    parts = []
+    for level in ('pincode', 'district', 'city', 'town'):
+        for rows in ((~has_pin, has_pin) if level in ('city', 'town')
+                     else (has_pin,)):
+            part = gazetteer.loc[rows, ['latitude', 'longitude']].assign(
+                place=keys[level][rows]
+            ).dropna(subset=['place'])
+            parts.append(part.groupby('place', sort=False).mean())
+    places = pd.concat(parts)
+    return places[~places.index.duplicated(keep='first')]
+
+
+def _distinct_places(stations: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Distinct pincode/city/state combinations and, per station, the
+    position of its combination. Stations share far fewer places than
+    there are rows, so the string work runs once per place."""
+    fields = stations[['pincode', 'city', 'state']].astype(object)
+    codes = fields.groupby(
+        list(fields.columns), dropna=False, sort=False
+    ).ngroup().to_numpy()
+    return fields.drop_duplicates().reset_index(drop=True), codes
+
+
+def _resolve_places(distinct: pd.DataFrame, places: pd.DataFrame) -> pd.DataFrame:
+    keys = _place_keys(distinct)
+    found = places.dropna(subset=['latitude'])
+    result = pd.DataFrame({
+        'latitude': np.nan, 'longitude': np.nan,
+        'precision': pd.Series(pd.NA, index=distinct.index, dtype='string'),
+    }, index=distinct.index)
+    pending = pd.Series(True, index=distinct.index)
+    for level in GEOCODE_LEVELS:
+        key = keys[level][pending]
+        hit = key.isin(found.index)
+        if not hit.any():
+            continue
+        rows = hit[hit].index
+        matched = found.loc[key[rows]]
+        result.loc[rows, 'latitude'] = matched['latitude'].to_numpy()
+        result.loc[rows, 'longitude'] = matched['longitude'].to_numpy()
+        result.loc[rows, 'precision'] = level
+        pending[rows] = False
+    return result
+
+
+def resolve_coordinates(stations: pd.DataFrame,
+                        places: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized lookup of station pincode/city/state against a place
+    table (see _gazetteer_places). Returns latitude, longitude and the
+    matched ``precision`` level, all NA for unresolved rows."""
+    distinct, codes = _distinct_places(stations)
+    return _resolve_places(distinct, places).iloc[codes].set_index(stations.index)
+
+
+def _needs_gazetteer(stations: pd.DataFrame, cached: pd.DataFrame) -> bool:
+    """True unless the cache settles every station: walking the levels in
+    order, each row reaches a cached hit before any key the cache has
+    never looked up (cached misses are skipped)."""
+    keys = _place_keys(stations)
+    pending = pd.Series(True, index=stations.index)
+    for level in GEOCODE_LEVELS:
+        key = keys[level]
+        known = key.isin(cached.index)
+        hit = key.isin(cached.dropna(subset=['latitude']).index)
+        if (pending & key.notna() & ~known).any():
+            return True
+        pending &= ~hit
+    return False
+
+
+def geocode_stations(gazetteer_paths: Iterable[Any], overwrite: bool = False,
+                     refresh_cache: bool = False) -> Dict[str, Any]:
+    """Fill station coordinates from local gazetteer files.
+
+    Only stations without coordinates are geocoded unless ``overwrite``.
+    Every place key looked up (hit or miss) is kept in geocode_cache, so
+    later runs skip reading the gazetteer when the cache already settles
+    every station; ``refresh_cache`` clears it after a gazetteer change.
+    Stations that cannot be resolved keep their current coordinates and
+    are returned in ``unresolved``. Returns counts per precision level,
+    rows updated and elapsed time.
+    """
+    began = time.perf_counter()
+    with get_conn() as conn:
+        if refresh_cache:
+            conn.execute("DELETE FROM geocode_cache")
+            conn.commit()
+        stations = pd.read_sql_query(
+            "SELECT station_id, name, city, state, pincode, latitude, longitude "
+            "FROM ev_charging_stations_reduced", conn,
+        )
+        cached = pd.read_sql_query(
+            "SELECT place, latitude, longitude FROM geocode_cache", conn,
+            index_col='place',
+        )
+    if not overwrite:
+        stations = stations[
+            stations['latitude'].isna() | stations['longitude'].isna()
+        ]
+    stations = stations.reset_index(drop=True)
+    current = stations[['latitude', 'longitude']].apply(pd.to_numeric, errors='coerce')
+
+    distinct, codes = _distinct_places(stations)
+    places, from_cache = cached, True
+    if len(stations) and _needs_gazetteer(distinct, cached):
+        places, from_cache = _gazetteer_places(load_gazetteer(gazetteer_paths)), False
+    resolved = _resolve_places(distinct, places).iloc[codes].set_index(stations.index)
+
+    changed = resolved['precision'].notna() & ~(
+        np.isclose(resolved['latitude'], current['latitude'])
+        & np.isclose(resolved['longitude'], current['longitude'])
+    )
+    updates = list(zip(
+        resolved.loc[changed, 'latitude'].round(6).tolist(),
+        resolved.loc[changed, 'longitude'].round(6).tolist(),
+        stations.loc[changed, 'station_id'].tolist(),
+    ))
+    with get_conn() as conn:
+        if not from_cache:
+            looked_up = pd.concat(_place_keys(distinct).values()).dropna().unique()
+            entries = places.reindex(looked_up)
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocode_cache (place, latitude, longitude) "
+                "VALUES (?, ?, ?)",
+                zip(entries.index, entries['latitude'].astype(object)
+                    .where(entries['latitude'].notna(), None),
+                    entries['longitude'].astype(object)
+                    .where(entries['longitude'].notna(), None)),
+            )
+        for start in range(0, len(updates), GEOCODE_WRITE_BATCH):
+            conn.executemany(
+                "UPDATE ev_charging_stations_reduced "
+                "SET latitude = ?, longitude = ? WHERE station_id = ?",
+                updates[start:start + GEOCODE_WRITE_BATCH],
+            )
+        conn.commit()
+    if updates:
+        station_catalog.invalidate()
+
+    unresolved = stations.loc[
+        resolved['precision'].isna(),
+        ['station_id', 'name', 'city', 'state', 'pincode'],
+    ]
+    counts = resolved['precision'].value_counts()
+    return {
+        'stations': len(stations),
+        'resolved': {level: int(counts.get(level, 0)) for level in GEOCODE_LEVELS},
+        'unresolved': unresolved.reset_index(drop=True),
+        'updated': len(updates),
+        'from_cache': from_cache,
+        'elapsed_s': round(time.perf_counter() - began, 2),
+    }
+
+
+def _get_station(conn: sqlite3.Connection, station_id: str) -> Optional[Dict[str, Any]]:
+    cursor = conn.execute(
+        "SELECT * FROM ev_charging_stations_reduced WHERE station_id = ?",
+        (station_id,)
+    )
+    station = cursor.fetchone()
+    if not station:
+        return None
+    columns = [desc[0] for desc in cursor.description]
+    return dict(zip(columns, station))
+
+
+def get_station(station_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a single station by primary key."""
+    with get_conn() as conn:
+        return _get_station(conn, station_id)
+
+
+def load_station_detail(station_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Load everything the station detail page needs from one read snapshot.
+
+    Returns None if the station does not exist, otherwise a dict with the
+    station ``row``, ``reviews``, ``comments``, ``avg_rating`` and
+    ``bookmarked`` (always False without a user).
+    """
+    with get_conn() as conn:
+        conn.execute("BEGIN")
+        row = _get_station(conn, station_id)
+        if row is None:
+            return None
+        return {
+            'row': row,
+            'reviews': _station_reviews(conn, station_id),
+            'comments': _station_comments(conn, station_id),
+            'avg_rating': _review_average(row),
+            'bookmarked': _is_bookmarked(conn, user_id, station_id)
+            if user_id else False,
+        }
 
 
 # ==================== User Authentication Functions ====================
@@ -302,24 +2629,24 @@ def add_review(station_id: str, user_id: int, rating: int, review_text: str = ""
                 (station_id, user_id, rating, review_text)
             )
             conn.commit()
-            return cursor.lastrowid
+            review_id = cursor.lastrowid
     except Exception:
         return None
-
-
-def get_station_reviews(station_id: str) -> List[Dict[str, Any]]:
-    """Get all reviews for a station with user info."""
-    with get_conn() as conn:
-        cursor = conn.execute(
-            """SELECT r.id, r.rating, r.review_text, r.created_at, 
-                      u.name, u.email
-               FROM reviews r
-               JOIN users u ON r.user_id = u.id
-               WHERE r.station_id = ?
-               ORDER BY r.created_at DESC""",
-            (station_id,)
-        )
-        reviews = cursor.fetchall()
+    # The insert trigger moved the station's rating aggregates.
+    station_catalog.sync()
+    return review_id
+
+
+def _station_reviews(conn: sqlite3.Connection, station_id: str) -> List[Dict[str, Any]]:
+    reviews = conn.execute(
+        """SELECT r.id, r.rating, r.review_text, r.created_at, 
+                  u.name, u.email
+           FROM reviews r
+           JOIN users u ON r.user_id = u.id
+           WHERE r.station_id = ?
+           ORDER BY r.created_at DESC""",
+        (station_id,)
+    ).fetchall()
     
     return [
         {
@@ -334,6 +2661,12 @@ def get_station_reviews(station_id: str) -> List[Dict[str, Any]]:
     ]
 
 
+def get_station_reviews(station_id: str) -> List[Dict[str, Any]]:
+    """Get all reviews for a station with user info."""
+    with get_conn() as conn:
+        return _station_reviews(conn, station_id)
+
+
 def get_user_reviews(user_id: int) -> List[Dict[str, Any]]:
     """Get all reviews by a user."""
     with get_conn() as conn:
@@ -361,21 +2694,52 @@ def get_user_reviews(user_id: int) -> List[Dict[str, Any]]:
     ]
 
 
+def _review_average(row: Dict[str, Any]) -> Optional[float]:
+    """Average user review rating from a station row's aggregates."""
+    if not row.get('rating_count'):
+        return None
+    return round(row['rating_sum'] / row['rating_count'], 1)
+
+
 def get_station_average_rating(station_id: str) -> Optional[float]:
     """Get average rating for a station."""
     with get_conn() as conn:
-        cursor = conn.execute(
-            "SELECT AVG(rating) FROM reviews WHERE station_id = ?",
+        row = conn.execute(
+            "SELECT rating_sum, rating_count FROM ev_charging_stations_reduced "
+            "WHERE station_id = ?",
             (station_id,)
-        )
-        result = cursor.fetchone()
-    
-    return round(result[0], 1) if result[0] else None
+        ).fetchone()
+    if not row:
+        return None
+    return _review_average({'rating_sum': row[0], 'rating_count': row[1]})
 
 
 def search_stations_by_location(search_term: str) -> pd.DataFrame:
-    """Search stations by city, state, or pincode."""
+    """Search stations by name, city, state, pincode, operator or landmark.
+
+    Every word is matched as a prefix ("mum" finds Mumbai) and results are
+    ranked by bm25. Falls back to a substring scan of city, state and
+    pincode when the full-text index is unavailable.
+    """
+    query = _fts_query(search_term)
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
     with get_conn() as conn:
+        if not query:
+            return pd.read_sql_query(
+                "SELECT * FROM ev_charging_stations_reduced WHERE 0", conn
+            )
+        try:
+            return pd.read_sql_query(
+                f"""SELECT s.* FROM stations_fts
+                    JOIN ev_charging_stations_reduced s
+                      ON s.rowid = stations_fts.rowid
+                    WHERE stations_fts MATCH ?
+                    ORDER BY bm25(stations_fts, {weights}), s.city, s.name""",
+                conn, params=(query,),
+            )
+        except Exception as e:
+            if 'stations_fts' not in str(e) and 'fts5' not in str(e):
+                raise
         sql = """
             SELECT * FROM ev_charging_stations_reduced 
             WHERE city LIKE ? OR state LIKE ? OR pincode LIKE ?
@@ -432,14 +2796,18 @@ def get_user_bookmarks(user_id: int) -> List[Dict[str, Any]]:
     return [dict(zip(columns, station)) for station in stations]
 
 
+def _is_bookmarked(conn: sqlite3.Connection, user_id: int, station_id: str) -> bool:
+    cursor = conn.execute(
+        "SELECT 1 FROM bookmarks WHERE user_id = ? AND station_id = ?",
+        (user_id, station_id)
+    )
+    return cursor.fetchone() is not None
+
+
 def is_bookmarked(user_id: int, station_id: str) -> bool:
     """Check if a station is bookmarked by user."""
     with get_conn() as conn:
-        cursor = conn.execute(
-            "SELECT 1 FROM bookmarks WHERE user_id = ? AND station_id = ?",
-            (user_id, station_id)
-        )
-        return cursor.fetchone() is not None
+        return _is_bookmarked(conn, user_id, station_id)
 
 
 # ==================== Comments Functions ====================
@@ -453,23 +2821,23 @@ def add_comment(station_id: str, user_id: int, comment_text: str) -> Optional[in
                 (station_id, user_id, comment_text)
             )
             conn.commit()
-            return cursor.lastrowid
+            comment_id = cursor.lastrowid
     except Exception:
         return None
-
-
-def get_station_comments(station_id: str) -> List[Dict[str, Any]]:
-    """Get all comments for a station."""
-    with get_conn() as conn:
-        cursor = conn.execute(
-            """SELECT c.id, c.comment_text, c.created_at, u.name, u.email
-               FROM comments c
-               JOIN users u ON c.user_id = u.id
-               WHERE c.station_id = ?
-               ORDER BY c.created_at DESC""",
-            (station_id,)
-        )
-        comments = cursor.fetchall()
+    # Comments live outside the catalog frame but show on station pages.
+    station_catalog.sync()
+    return comment_id
+
+
+def _station_comments(conn: sqlite3.Connection, station_id: str) -> List[Dict[str, Any]]:
+    comments = conn.execute(
+        """SELECT c.id, c.comment_text, c.created_at, u.name, u.email
+           FROM comments c
+           JOIN users u ON c.user_id = u.id
+           WHERE c.station_id = ?
+           ORDER BY c.created_at DESC""",
+        (station_id,)
+    ).fetchall()
     
     return [
         {
@@ -483,6 +2851,12 @@ def get_station_comments(station_id: str) -> List[Dict[str, Any]]:
     ]
 
 
+def get_station_comments(station_id: str) -> List[Dict[str, Any]]:
+    """Get all comments for a station."""
+    with get_conn() as conn:
+        return _station_comments(conn, station_id)
+
+
 # ==================== Search History Functions ====================
 
 def save_search_history(user_id: int, search_term: str = "", filters: str = ""):
@@ -520,16 +2894,89 @@ def get_recent_searches(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
 
 # ==================== Notifications Functions ====================
 
+def _insert_notification(conn: sqlite3.Connection, user_id: int, message: str,
+                         station_id: str = None):
+    conn.execute(
+        "INSERT INTO notifications (user_id, station_id, message) VALUES (?, ?, ?)",
+        (user_id, station_id, message)
+    )
+
+
 def create_notification(user_id: int, message: str, station_id: str = None):
     """Create a notification for a user."""
     with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO notifications (user_id, station_id, message) VALUES (?, ?, ?)",
-            (user_id, station_id, message)
-        )
+        _insert_notification(conn, user_id, message, station_id)
         conn.commit()
 
 
+# Audiences above this size are notified in background batches so a
+# status change on a popular station does not hold the admin request.
+FANOUT_SYNC_LIMIT = int(os.environ.get("EV_FANOUT_SYNC_LIMIT", "5000"))
+FANOUT_BATCH_SIZE = int(os.environ.get("EV_FANOUT_BATCH_SIZE", "2000"))
+
+
+def _bookmark_holder_count(conn: sqlite3.Connection, station_id: str) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM bookmarks WHERE station_id = ?", (station_id,)
+    ).fetchone()[0]
+
+
+def _fan_out_batch(conn: sqlite3.Connection, station_id: str, message: str,
+                   after_user: int = 0, limit: int = -1) -> Optional[int]:
+    """Notify bookmark holders of a station with user_id > after_user, at
+    most ``limit`` of them (-1: all), in one INSERT ... SELECT. Returns the
+    last user_id notified, or None if there was nobody left."""
+    last = conn.execute(
+        """SELECT MAX(user_id) FROM (
+             SELECT user_id FROM bookmarks
+             WHERE station_id = ? AND user_id > ?
+             ORDER BY user_id LIMIT ?)""",
+        (station_id, after_user, limit)
+    ).fetchone()[0]
+    if last is None:
+        return None
+    conn.execute(
+        """INSERT INTO notifications (user_id, station_id, message)
+           SELECT user_id, station_id, ? FROM bookmarks
+           WHERE station_id = ? AND user_id > ? AND user_id <= ?""",
+        (message, station_id, after_user, last)
+    )
+    return last
+
+
+def _fan_out_in_background(station_id: str, message: str):
+    """Notify a station's bookmark holders in FANOUT_BATCH_SIZE chunks, one
+    short transaction each, from a daemon thread."""
+    def run():
+        last = 0
+        try:
+            while last is not None:
+                with get_conn() as conn:
+                    last = _fan_out_batch(conn, station_id, message, last,
+                                          FANOUT_BATCH_SIZE)
+                    conn.commit()
+        except Exception:
+            logger.exception("Notification fan-out for %s stopped after "
+                             "user %s", station_id, last)
+
+    threading.Thread(
+        target=run, name=f"fanout-{station_id}", daemon=True
+    ).start()
+
+
+def notify_bookmark_holders(station_id: str, message: str) -> int:
+    """Send message to every user who bookmarked the station; returns the
+    audience size. Large audiences are notified in the background."""
+    with get_conn() as conn:
+        count = _bookmark_holder_count(conn, station_id)
+        if count <= FANOUT_SYNC_LIMIT:
+            _fan_out_batch(conn, station_id, message)
+            conn.commit()
+            return count
+    _fan_out_in_background(station_id, message)
+    return count
+
+
 def get_user_notifications(user_id: int, unread_only: bool = False) -> List[Dict[str, Any]]:
     """Get notifications for a user."""
     with get_conn() as conn:
@@ -553,27 +3000,48 @@ def get_user_notifications(user_id: int, unread_only: bool = False) -> List[Dict
     ]
 
 
-def mark_notification_read(notification_id: int):
-    """Mark a notification as read."""
+def mark_notification_read(notification_id: int, user_id: int = None):
+    """Mark a notification as read (only if it belongs to user_id, when
+    given)."""
+    sql = "UPDATE notifications SET is_read = 1 WHERE id = ? AND is_read = 0"
+    params = [notification_id]
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
     with get_conn() as conn:
-        conn.execute(
-            "UPDATE notifications SET is_read = 1 WHERE id = ?",
-            (notification_id,)
+        conn.execute(sql, params)
+        conn.commit()
+
+
+def mark_all_notifications_read(user_id: int) -> int:
+    """Mark every unread notification of a user as read; returns how many."""
+    with get_conn() as conn:
+        cursor = conn.execute(
+            "UPDATE notifications SET is_read = 1 WHERE user_id = ? AND is_read = 0",
+            (user_id,)
         )
         conn.commit()
+        return cursor.rowcount
 
 
 def get_unread_count(user_id: int) -> int:
-    """Get count of unread notifications."""
+    """Get count of unread notifications from the user's counter row."""
     with get_conn() as conn:
         cursor = conn.execute(
-            "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0",
+            "SELECT unread FROM notification_counters WHERE user_id = ?",
             (user_id,)
         )
         result = cursor.fetchone()
     return result[0] if result else 0
 
 
+def reconcile_notification_counters():
+    """Rebuild all unread counters from scratch (e.g. after manual edits
+    made with the triggers disabled)."""
+    with get_conn() as conn:
+        rebuild_notification_counters(conn)
+
+
 # ==================== Wallet Functions ====================
 
 def get_or_create_wallet(user_id: int) -> Dict[str, Any]:
@@ -607,40 +3075,70 @@ def get_wallet_balance(user_id: int) -> float:
     return wallet['balance']
 
 
-def add_to_wallet(user_id: int, amount: float, description: str = ""):
-    """Add money to user's wallet."""
+def _wallet_entry(conn: sqlite3.Connection, user_id: int, amount: float,
+                  transaction_type: str, description: str = "",
+                  booking_id: int = None, idempotency_key: str = None) -> bool:
+    """Append a ledger row; False if idempotency_key has been used before.
+    Any other constraint failure raises."""
+    cursor = conn.execute(
+        "INSERT INTO wallet_transactions (user_id, amount, transaction_type, description, booking_id, idempotency_key) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING",
+        (user_id, amount, transaction_type, description, booking_id, idempotency_key)
+    )
+    return cursor.rowcount == 1
+
+
+def _credit_wallet(conn: sqlite3.Connection, user_id: int, amount: float):
+    conn.execute(
+        """INSERT INTO wallets (user_id, balance) VALUES (?, ?)
+           ON CONFLICT(user_id) DO UPDATE SET
+             balance = balance + excluded.balance,
+             updated_at = CURRENT_TIMESTAMP""",
+        (user_id, amount)
+    )
+
+
+def _debit_wallet(conn: sqlite3.Connection, user_id: int, amount: float) -> bool:
+    """Take amount from the wallet only if the balance covers it."""
+    cursor = conn.execute(
+        "UPDATE wallets SET balance = balance - ?, updated_at = CURRENT_TIMESTAMP "
+        "WHERE user_id = ? AND balance >= ?",
+        (amount, user_id, amount)
+    )
+    return cursor.rowcount == 1
+
+
+def add_to_wallet(user_id: int, amount: float, description: str = "",
+                  idempotency_key: str = None) -> bool:
+    """Add money to user's wallet.
+
+    A repeated idempotency_key is acknowledged without crediting again.
+    """
+    if amount <= 0:
+        return False
     with get_conn() as conn:
-        conn.execute(
-            "UPDATE wallets SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (amount, user_id)
-        )
-        conn.execute(
-            "INSERT INTO wallet_transactions (user_id, amount, transaction_type, description) VALUES (?, ?, 'credit', ?)",
-            (user_id, amount, description)
-        )
+        if _wallet_entry(conn, user_id, amount, 'credit', description,
+                         idempotency_key=idempotency_key):
+            _credit_wallet(conn, user_id, amount)
         conn.commit()
+    return True
+
 
+def deduct_from_wallet(user_id: int, amount: float, description: str = "",
+                       booking_id: int = None, idempotency_key: str = None) -> bool:
+    """Deduct money from user's wallet if the balance covers it.
 
-def deduct_from_wallet(user_id: int, amount: float, description: str = "", booking_id: int = None):
-    """Deduct money from user's wallet."""
+    A repeated idempotency_key is acknowledged without debiting again.
+    """
+    if amount <= 0:
+        return False
     with get_conn() as conn:
-        cursor = conn.execute(
-            "SELECT balance FROM wallets WHERE user_id = ?",
-            (user_id,)
-        )
-        result = cursor.fetchone()
-        
-        if not result or result[0] < amount:
+        if not _wallet_entry(conn, user_id, -amount, 'debit', description,
+                             booking_id, idempotency_key):
+            return True
+        if not _debit_wallet(conn, user_id, amount):
+            conn.rollback()
             return False
-        
-        conn.execute(
-            "UPDATE wallets SET balance = balance - ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (amount, user_id)
-        )
-        conn.execute(
-            "INSERT INTO wallet_transactions (user_id, amount, transaction_type, description, booking_id) VALUES (?, ?, 'debit', ?, ?)",
-            (user_id, -amount, description, booking_id)
-        )
         conn.commit()
         return True
 
@@ -737,54 +3235,54 @@ def get_all_payment_requests() -> List[Dict[str, Any]]:
     ]
 
 
+def _settle_payment_request(conn: sqlite3.Connection, request_id: int,
+                            status: str, admin_notes: str) -> Optional[Tuple[int, float]]:
+    """Move a pending request to status; (user_id, amount), or None if it
+    was not pending."""
+    cursor = conn.execute(
+        "UPDATE payment_requests SET status = ?, admin_notes = ?, verified_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'pending'",
+        (status, admin_notes, request_id)
+    )
+    if cursor.rowcount != 1:
+        return None
+    return conn.execute(
+        "SELECT user_id, amount FROM payment_requests WHERE id = ?",
+        (request_id,)
+    ).fetchone()
+
+
 def approve_payment_request(request_id: int, admin_notes: str = "") -> bool:
-    """Approve payment request and add money to user wallet."""
+    """Approve a pending payment request and add money to user wallet."""
     with get_conn() as conn:
-        cursor = conn.execute(
-            "SELECT user_id, amount FROM payment_requests WHERE id = ?",
-            (request_id,)
-        )
-        result = cursor.fetchone()
+        result = _settle_payment_request(conn, request_id, 'approved', admin_notes)
         
         if not result:
             return False
         
         user_id, amount = result
         
-        conn.execute(
-            "UPDATE payment_requests SET status = 'approved', admin_notes = ?, verified_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (admin_notes, request_id)
-        )
+        if _wallet_entry(conn, user_id, amount, 'credit',
+                         f"Payment approved - Request #{request_id}",
+                         idempotency_key=f"payment:{request_id}"):
+            _credit_wallet(conn, user_id, amount)
+        _insert_notification(conn, user_id, f"Your payment of ₹{amount} has been approved and added to your wallet!")
         conn.commit()
     
-    add_to_wallet(user_id, amount, f"Payment approved - Request #{request_id}")
-    create_notification(user_id, f"Your payment of ₹{amount} has been approved and added to your wallet!")
-    
     return True
 
 
 def reject_payment_request(request_id: int, admin_notes: str = "") -> bool:
-    """Reject payment request."""
+    """Reject a pending payment request."""
     with get_conn() as conn:
-        cursor = conn.execute(
-            "SELECT user_id, amount FROM payment_requests WHERE id = ?",
-            (request_id,)
-        )
-        result = cursor.fetchone()
+        result = _settle_payment_request(conn, request_id, 'rejected', admin_notes)
         
         if not result:
             return False
         
         user_id, amount = result
-        
-        conn.execute(
-            "UPDATE payment_requests SET status = 'rejected', admin_notes = ?, verified_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (admin_notes, request_id)
-        )
+        _insert_notification(conn, user_id, f"Your payment request of ₹{amount} was rejected. Reason: {admin_notes}")
         conn.commit()
     
-    create_notification(user_id, f"Your payment request of ₹{amount} was rejected. Reason: {admin_notes}")
-    
     return True
 
 
@@ -812,17 +3310,236 @@ def get_user_payment_requests(user_id: int) -> List[Dict[str, Any]]:
     ]
 
 
+# ==================== Charger Slot Scheduling ====================
+
+SLOT_STEP_MINUTES = 30
+MAX_BOOKING_HOURS = 24
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SlotUnavailableError(Exception):
+    """Every charger at the station is taken for the requested window."""
+
+    def __init__(self, station_id: str, next_slots: List[Tuple[str, str]]):
+        super().__init__(f"No free charger at station {station_id}")
+        self.station_id = station_id
+        self.next_slots = next_slots
+
+
+class StationNotFoundError(LookupError):
+    """No station with the requested id, so it has no chargers to book."""
+
+    def __init__(self, station_id: str):
+        super().__init__(f"No station {station_id}")
+        self.station_id = station_id
+
+
+def _to_minutes(booking_date: str, booking_time: str = "00:00") -> int:
+    """'YYYY-MM-DD', 'HH:MM' -> minutes since 1970-01-01 (ValueError if bad)."""
+    dt = datetime.fromisoformat(f"{booking_date}T{booking_time}")
+    return int((dt - _EPOCH).total_seconds() // 60)
+
+
+def _from_minutes(minutes: int) -> Tuple[str, str]:
+    dt = _EPOCH + timedelta(minutes=minutes)
+    return dt.strftime("%Y-%m-%d"), dt.strftime("%H:%M")
+
+
+def _duration_minutes(duration_hours: float) -> int:
+    hours = float(duration_hours)
+    if not math.isfinite(hours):
+        raise ValueError("duration must be a finite number of hours")
+    minutes = int(round(hours * 60))
+    if not 0 < minutes <= MAX_BOOKING_HOURS * 60:
+        raise ValueError(f"duration must be within (0, {MAX_BOOKING_HOURS}] hours")
+    return minutes
+
+
+class ChargerSchedule:
+    """Charger occupancy of one station over a window of time.
+
+    Confirmed bookings are swept once, in start order, into the maximal
+    runs during which at least one of ``capacity`` chargers is free. Both
+    queries then bisect into those runs, so "is [t, t+d) free" costs
+    O(log n). Times are minutes since 1970-01-01 and bookings are
+    half-open, so back-to-back bookings share a charger.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int]], capacity: Optional[int],
+                 start: int, end: int):
+        self.capacity = max(int(capacity or 1), 1)
+        self.start, self.end = start, end
+        # Ends sort before starts at the same minute.
+        events = sorted(
+            [(s, 1) for s, _ in intervals] + [(e, -1) for _, e in intervals]
+        )
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        load, prev = 0, start
+        for t, delta in events:
+            t = min(max(t, start), end)
+            if t > prev and load < self.capacity:
+                self._add_run(prev, t)
+            prev = max(prev, t)
+            load += delta
+        if end > prev and load < self.capacity:
+            self._add_run(prev, end)
+
+    def _add_run(self, start: int, end: int):
+        if self._ends and self._ends[-1] == start:
+            self._ends[-1] = end
+        else:
+            self._starts.append(start)
+            self._ends.append(end)
+
+    def is_free(self, start: int, minutes: int) -> bool:
+        """True if a charger is free for the whole of [start, start+minutes)."""
+        i = bisect.bisect_right(self._starts, start) - 1
+        return i >= 0 and start + minutes <= self._ends[i]
+
+    def next_free(self, start: int, minutes: int, count: int = 5,
+                  step: int = SLOT_STEP_MINUTES) -> List[int]:
+        """Up to ``count`` start times at or after ``start`` with a charger
+        free for ``minutes``, earliest first and ``step`` minutes apart
+        within a free run."""
+        slots: List[int] = []
+        i = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        while i < len(self._starts) and len(slots) < count:
+            t = max(self._starts[i], start)
+            while t + minutes <= self._ends[i] and len(slots) < count:
+                slots.append(t)
+                t += step
+            i += 1
+        return slots
+
+
+def _station_schedule(conn: sqlite3.Connection, station_id: str,
+                      booking_date: str) -> ChargerSchedule:
+    """Schedule covering booking_date and the days either side of it, which
+    holds every booking that can overlap a slot starting that day. Raises
+    StationNotFoundError for an unknown station."""
+    day = datetime.fromisoformat(booking_date).date()
+    first, last = day - timedelta(days=1), day + timedelta(days=1)
+    row = conn.execute(
+        "SELECT number_of_chargers FROM ev_charging_stations_reduced "
+        "WHERE station_id = ?", (station_id,)
+    ).fetchone()
+    if row is None:
+        raise StationNotFoundError(station_id)
+    rows = conn.execute(
+        """SELECT booking_date, booking_time, duration_hours FROM bookings
+           WHERE station_id = ? AND booking_date BETWEEN ? AND ?
+           AND booking_status = 'confirmed'""",
+        (station_id, first.isoformat(), last.isoformat())
+    ).fetchall()
+    intervals = []
+    for b_date, b_time, hours in rows:
+        try:
+            s = _to_minutes(b_date, b_time)
+            intervals.append((s, s + int(round(float(hours) * 60))))
+        except (TypeError, ValueError):
+            logger.warning("Skipping malformed booking %s %s at %s",
+                           b_date, b_time, station_id)
+    return ChargerSchedule(
+        intervals, row[0],
+        _to_minutes(first.isoformat()),
+        _to_minutes((last + timedelta(days=1)).isoformat()),
+    )
+
+
+def is_slot_free(station_id: str, booking_date: str, booking_time: str,
+                 duration_hours: float) -> bool:
+    """True if one of the station's chargers is free for the whole slot."""
+    start = _to_minutes(booking_date, booking_time)
+    minutes = _duration_minutes(duration_hours)
+    with get_conn() as conn:
+        return _station_schedule(conn, station_id, booking_date).is_free(
+            start, minutes)
+
+
+def next_free_slots(station_id: str, booking_date: str, booking_time: str,
+                    duration_hours: float, count: int = 5) -> List[Tuple[str, str]]:
+    """The next (date, time) starts, from the requested one onwards, with a
+    charger free for the duration."""
+    start = _to_minutes(booking_date, booking_time)
+    minutes = _duration_minutes(duration_hours)
+    with get_conn() as conn:
+        schedule = _station_schedule(conn, station_id, booking_date)
+    return [_from_minutes(t) for t in schedule.next_free(start, minutes, count)]
+
+
 # ==================== Booking Functions ====================
 
-def create_booking(user_id: int, station_id: str, booking_date: str, 
-                   booking_time: str, duration_hours: float, total_amount: float) -> Optional[int]:
-    """Create a new booking."""
-    balance = get_wallet_balance(user_id)
-    
-    if balance < total_amount:
-        return None
-    
+BOOKING_RETRIES = int(os.environ.get("EV_BOOKING_RETRIES", "3"))
+
+
+class BookingMetrics:
+    """Outcome counts, latency and lock-contention figures for create_booking."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=window)
+        self.outcomes: Dict[str, int] = {}
+        self.retries = 0
+        self.lock_wait_total = 0.0
+        self.lock_wait_max = 0.0
+
+    def record(self, outcome: str, seconds: float, retries: int):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.retries += retries
+            self._latencies.append(seconds)
+
+    def record_lock_wait(self, seconds: float):
+        with self._lock:
+            self.lock_wait_total += seconds
+            self.lock_wait_max = max(self.lock_wait_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            attempts = sum(self.outcomes.values())
+            p50, p95, p99 = (
+                np.percentile(latencies, [50, 95, 99]) if len(latencies)
+                else (0.0, 0.0, 0.0)
+            )
+            return {
+                'attempts': attempts,
+                'outcomes': dict(self.outcomes),
+                'retries': self.retries,
+                'latency_p50_ms': round(float(p50), 3),
+                'latency_p95_ms': round(float(p95), 3),
+                'latency_p99_ms': round(float(p99), 3),
+                'lock_wait_avg_ms': round(
+                    self.lock_wait_total * 1000 / attempts, 3
+                ) if attempts else 0.0,
+                'lock_wait_max_ms': round(self.lock_wait_max * 1000, 3),
+            }
+
+
+booking_metrics = BookingMetrics()
+
+
+def booking_stats() -> Dict[str, Any]:
+    return booking_metrics.stats()
+
+
+def _book(user_id: int, station_id: str, booking_date: str, booking_time: str,
+          duration_hours: float, total_amount: float, start: int,
+          minutes: int) -> Optional[int]:
+    """One attempt at the booking transaction; see create_booking."""
     with get_conn() as conn:
+        began = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        booking_metrics.record_lock_wait(time.perf_counter() - began)
+        schedule = _station_schedule(conn, station_id, booking_date)
+        if not schedule.is_free(start, minutes):
+            raise SlotUnavailableError(station_id, [
+                _from_minutes(t) for t in schedule.next_free(start, minutes)
+            ])
+        if not _debit_wallet(conn, user_id, total_amount):
+            conn.rollback()
+            return None
         cursor = conn.execute(
             """INSERT INTO bookings 
                (user_id, station_id, booking_date, booking_time, 
@@ -832,14 +3549,52 @@ def create_booking(user_id: int, station_id: str, booking_date: str,
              duration_hours, total_amount)
         )
         booking_id = cursor.lastrowid
+        _wallet_entry(conn, user_id, -total_amount, 'debit', f"Booking for station {station_id} on {booking_date} at {booking_time}", booking_id)
+        _insert_notification(conn, user_id, f"Booking confirmed! Station booked for {booking_date} at {booking_time}", station_id)
         conn.commit()
-    
-    deduct_from_wallet(user_id, total_amount, f"Booking for station {station_id} on {booking_date} at {booking_time}", booking_id)
-    create_notification(user_id, f"Booking confirmed! Station booked for {booking_date} at {booking_time}", station_id)
-    
     return booking_id
 
 
+def create_booking(user_id: int, station_id: str, booking_date: str, 
+                   booking_time: str, duration_hours: float, total_amount: float) -> Optional[int]:
+    """Create a new booking.
+
+    The capacity check, wallet debit, booking row, ledger entry and
+    notification are written in a single BEGIN IMMEDIATE transaction,
+    retried up to BOOKING_RETRIES times if the write lock cannot be taken.
+    Returns None on insufficient balance. Raises SlotUnavailableError when
+    every charger is taken for the slot, StationNotFoundError for an
+    unknown station and ValueError on a malformed date, time or duration.
+    """
+    start = _to_minutes(booking_date, booking_time)
+    minutes = _duration_minutes(duration_hours)
+    began = time.perf_counter()
+    retries, outcome = 0, 'error'
+    try:
+        while True:
+            try:
+                booking_id = _book(user_id, station_id, booking_date,
+                                   booking_time, duration_hours, total_amount,
+                                   start, minutes)
+                outcome = 'confirmed' if booking_id else 'insufficient_balance'
+                return booking_id
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or retries >= BOOKING_RETRIES:
+                    raise
+                retries += 1
+                logger.warning("Booking for %s hit a locked database, "
+                               "retry %d", station_id, retries)
+                time.sleep(0.05 * retries)
+    except SlotUnavailableError:
+        outcome = 'slot_unavailable'
+        raise
+    except StationNotFoundError:
+        outcome = 'station_not_found'
+        raise
+    finally:
+        booking_metrics.record(outcome, time.perf_counter() - began, retries)
+
+
 def get_user_bookings(user_id: int) -> List[Dict[str, Any]]:
     """Get all bookings for a user (only upcoming and today's bookings)."""
     with get_conn() as conn:
@@ -970,28 +3725,29 @@ def get_all_bookings() -> List[Dict[str, Any]]:
 
 
 def cancel_booking(booking_id: int, user_id: int) -> bool:
-    """Cancel a booking and refund to wallet."""
+    """Cancel a booking and refund to wallet.
+
+    The status change, refund and notification commit together, and only
+    the request that flips the booking to cancelled issues the refund.
+    """
     with get_conn() as conn:
         cursor = conn.execute(
-            "SELECT total_amount, booking_status FROM bookings WHERE id = ? AND user_id = ?",
+            "UPDATE bookings SET booking_status = 'cancelled' "
+            "WHERE id = ? AND user_id = ? AND booking_status != 'cancelled'",
             (booking_id, user_id)
         )
-        result = cursor.fetchone()
-        
-        if not result or result[1] == 'cancelled':
+        if cursor.rowcount != 1:
             return False
         
-        total_amount = result[0]
+        total_amount = conn.execute(
+            "SELECT total_amount FROM bookings WHERE id = ?", (booking_id,)
+        ).fetchone()[0]
         
-        conn.execute(
-            "UPDATE bookings SET booking_status = 'cancelled' WHERE id = ?",
-            (booking_id,)
-        )
+        if _wallet_entry(conn, user_id, total_amount, 'credit',
+                         f"Refund for cancelled booking #{booking_id}",
+                         booking_id, f"refund:booking:{booking_id}"):
+            _credit_wallet(conn, user_id, total_amount)
+        _insert_notification(conn, user_id, f"Booking #{booking_id} cancelled. ₹{total_amount} refunded to your wallet.")
         conn.commit()
     
-    add_to_wallet(user_id, total_amount, f"Refund for cancelled booking #{booking_id}")
-    create_notification(user_id, f"Booking #{booking_id} cancelled. ₹{total_amount} refunded to your wallet.")
-    
     return True
-
-
@@ -0,0 +1,340 @@
+"""Load-test the Flask routes with concurrent virtual users.
+
+Each virtual user logs in with its own session and, for the length of the
+run, picks requests from MIX by weight: filtered station listings, station
+detail pages, booking POSTs, the dashboard, the wallet and analytics.
+Requests go through the Flask test client in-process, or over HTTP to a
+real threaded WSGI server with ``--server``. The run reports p50/p95/p99
+latency, throughput and error rate per endpoint and overall, can save
+them as JSON, and can compare them against a saved baseline:
+
+    python bench_http.py --users 16 --duration 30 --out baseline.json
+    python bench_http.py --users 16 --duration 30 --baseline baseline.json
+
+By default the run uses a throwaway copy of the bundled station dump; pass
+``--db`` to load-test an existing (e.g. generated) database instead. A
+request counts as an error when it raises or returns a 5xx status.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+import app_db
+
+PASSWORD = "loadtest1"
+CITIES_SAMPLE = 20
+
+
+class TestClientSession:
+    """One virtual user's cookie session on the in-process test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, data=None) -> int:
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """One virtual user's cookie session against a real server. Redirects
+    are not followed, matching the test client."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def request(self, method: str, path: str, data=None) -> int:
+        body = urllib.parse.urlencode(data).encode() if data else None
+        req = urllib.request.Request(self.base_url + path, data=body,
+                                     method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+# ---- request mix -----------------------------------------------------------
+
+def stations_listing(session, rnd, ctx):
+    params = {}
+    if rnd.random() < 0.5:
+        params['city'] = rnd.choice(ctx['cities'])
+    if rnd.random() < 0.3:
+        low = rnd.randint(5, 25)
+        params.update(price_min=low, price_max=low + rnd.randint(2, 10))
+    if rnd.random() < 0.3:
+        params['rating_min'] = rnd.choice([3, 3.5, 4, 4.5])
+    if rnd.random() < 0.2:
+        params['status'] = 'Active'
+    return session.request("GET", "/stations?" + urllib.parse.urlencode(params))
+
+
+def station_detail(session, rnd, ctx):
+    return session.request("GET", f"/station/{rnd.choice(ctx['stations'])}")
+
+
+def book_station(session, rnd, ctx):
+    day = date.today() + timedelta(days=rnd.randint(1, 60))
+    return session.request(
+        "POST", f"/station/{rnd.choice(ctx['stations'])}/book",
+        {'booking_date': day.isoformat(),
+         'booking_time': f"{rnd.randint(6, 21):02d}:{rnd.choice(['00', '30'])}",
+         'duration': rnd.choice(['0.5', '1', '2']),
+         'charger_power': rnd.choice(['7.4', '22', '50'])},
+    )
+
+
+def dashboard(session, rnd, ctx):
+    return session.request("GET", "/user/dashboard")
+
+
+def wallet(session, rnd, ctx):
+    return session.request("GET", "/wallet")
+
+
+def analytics(session, rnd, ctx):
+    return session.request("GET", "/analytics")
+
+
+# (endpoint name, relative weight, request function)
+MIX = [
+    ('GET /stations', 40, stations_listing),
+    ('GET /station/<id>', 25, station_detail),
+    ('POST /station/<id>/book', 5, book_station),
+    ('GET /user/dashboard', 10, dashboard),
+    ('GET /wallet', 10, wallet),
+    ('GET /analytics', 10, analytics),
+]
+
+
+# ---- run -------------------------------------------------------------------
+
+def prepare_users(n_users: int):
+    """Create (or reuse) one funded account per virtual user."""
+    emails = []
+    for i in range(n_users):
+        email = f"loadtest{i}@example.com"
+        user = app_db.get_user_by_email(email)
+        if not user:
+            app_db.create_user(f"Load Test {i}", email, PASSWORD)
+            user = app_db.get_user_by_email(email)
+        app_db.add_to_wallet(user['id'], 1_000_000.0, "load test funds")
+        emails.append(email)
+    return emails
+
+
+def virtual_user(session, email, ctx, deadline, seed_value, samples, errors):
+    rnd = random.Random(seed_value)
+    names = [m[0] for m in MIX]
+    weights = [m[1] for m in MIX]
+    funcs = {m[0]: m[2] for m in MIX}
+    session.request("POST", "/user/login",
+                    {'email': email, 'password': PASSWORD})
+    while time.perf_counter() < deadline:
+        name = rnd.choices(names, weights)[0]
+        began = time.perf_counter()
+        try:
+            status = funcs[name](session, rnd, ctx)
+            failed = status >= 500
+        except Exception as e:
+            failed = True
+            errors.append(f"{name}: {e!r}")
+        samples.append((name, time.perf_counter() - began, failed))
+
+
+def summarize(samples, elapsed: float) -> dict:
+    def stats(rows):
+        latencies = np.array([r[1] for r in rows]) * 1000
+        failures = sum(1 for r in rows if r[2])
+        p50, p95, p99 = (np.percentile(latencies, [50, 95, 99])
+                         if len(latencies) else (0.0, 0.0, 0.0))
+        return {
+            'requests': len(rows),
+            'errors': failures,
+            'error_rate': round(failures / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(rows) / elapsed, 1),
+            'mean_ms': round(float(latencies.mean()), 2) if len(rows) else 0.0,
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+        }
+
+    endpoints = {
+        name: stats([s for s in samples if s[0] == name])
+        for name, _, _ in MIX
+    }
+    return {'overall': stats(samples), 'endpoints': endpoints}
+
+
+def run(args, app) -> dict:
+    frame = app_db.as_dataframe()
+    ctx = {
+        'stations': frame['station_id'].tolist(),
+        'cities': frame['city'].dropna().unique().tolist()[:CITIES_SAMPLE],
+    }
+    if not ctx['stations']:
+        raise SystemExit("No stations in the database to load-test")
+    emails = prepare_users(args.users)
+
+    server = None
+    if args.server:
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        sessions = [HttpSession(base_url) for _ in emails]
+    else:
+        sessions = [TestClientSession(app) for _ in emails]
+
+    samples, errors = [], []
+    began = time.perf_counter()
+    deadline = began + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(
+            session, email, ctx, deadline, args.seed + i, samples, errors,
+        ))
+        for i, (session, email) in enumerate(zip(sessions, emails))
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    if server:
+        server.shutdown()
+
+    for line in errors[:10]:
+        print(f"  error: {line}", file=sys.stderr)
+    return {
+        'meta': {
+            'users': args.users,
+            'duration_s': round(elapsed, 2),
+            'transport': 'wsgi-server' if args.server else 'test-client',
+            'stations': len(ctx['stations']),
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        **summarize(samples, elapsed),
+    }
+
+
+def print_results(results: dict):
+    meta = results['meta']
+    print(f"{meta['users']} virtual users for {meta['duration_s']}s "
+          f"via {meta['transport']}, {meta['stations']:,} stations")
+    print(f"  {'endpoint':<26}{'reqs':>7}{'err%':>7}{'rps':>8}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}")
+    rows = list(results['endpoints'].items()) + [('overall', results['overall'])]
+    for name, s in rows:
+        print(f"  {name:<26}{s['requests']:>7}{s['error_rate'] * 100:>6.1f}%"
+              f"{s['throughput_rps']:>8.1f}{s['p50_ms']:>9.1f}"
+              f"{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions against a baseline: p95 latency or error rate up, or
+    throughput down, by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    rows = [('overall', results['overall'], baseline.get('overall'))] + [
+        (name, s, baseline.get('endpoints', {}).get(name))
+        for name, s in results['endpoints'].items()
+    ]
+    print(f"\nAgainst baseline ({baseline['meta'].get('started_at', '?')}):")
+    for name, now, before in rows:
+        if not before or not now['requests'] or not before['requests']:
+            continue
+        p95 = now['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+        print(f"  {name:<26}p95 {before['p95_ms']:.1f} -> {now['p95_ms']:.1f}ms "
+              f"({p95:+.0%})")
+        if p95 > tolerance:
+            regressions.append(f"{name}: p95 up {p95:.0%}")
+        if now['error_rate'] > before['error_rate'] + 0.01:
+            regressions.append(f"{name}: error rate {before['error_rate']:.1%}"
+                               f" -> {now['error_rate']:.1%}")
+    before_rps = baseline['overall']['throughput_rps']
+    if before_rps and results['overall']['throughput_rps'] < before_rps * (1 - tolerance):
+        regressions.append(
+            f"throughput {before_rps} -> {results['overall']['throughput_rps']} rps"
+        )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8,
+                        help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds to run")
+    parser.add_argument("--server", action="store_true",
+                        help="go over HTTP to a threaded WSGI server")
+    parser.add_argument("--db", type=Path,
+                        help="database to test against (default: a throwaway "
+                             "copy of the bundled dump)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="save results as JSON")
+    parser.add_argument("--baseline", type=Path,
+                        help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed regression vs the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ev_http_")
+    try:
+        if args.db:
+            app_db.DB_PATH = args.db
+        else:
+            import import_sqlite
+            app_db.DB_PATH = Path(workdir) / "http.db"
+            app_db.init_db()
+            import_sqlite.main([str(import_sqlite.DEFAULT_FEED)])
+        from flask_app import create_app
+        app = create_app()
+        results = run(args, app)
+    finally:
+        app_db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+        print(f"\nSaved results to {args.out}")
+    failures = results['overall']['errors']
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()),
+                              args.tolerance)
+        for r in regressions:
+            print(f"  REGRESSION {r}")
+        failures += len(regressions)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
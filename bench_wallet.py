@@ -0,0 +1,202 @@
+"""Hammer the wallet from many threads and check the books still balance.
+
+Seeds a throwaway database with a handful of hot wallets and confirmed
+bookings, then runs a random mix of deduct_from_wallet, add_to_wallet and
+cancel_booking from N threads. Some calls reuse idempotency keys and several
+threads race to cancel the same booking. Afterwards every wallet is checked
+against its ledger:
+
+  * no balance below zero
+  * balance equals the sum of the wallet's ledger rows
+  * no idempotency key applied twice
+  * every cancelled booking refunded exactly once, and only once per
+    successful cancel_booking call
+  * a booking at an unknown station is refused without charging the wallet
+
+    python bench_wallet.py [--threads 8] [--ops 500] [--users 10]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import app_db
+
+STATION_ID = "BENCH001"
+
+
+def seed(n_users: int, n_bookings: int, rnd: random.Random):
+    app_db.upsert_station({
+        'station_id': STATION_ID, 'name': 'Bench Station', 'city': 'Pune',
+        'number_of_chargers': n_bookings, 'status': 'Active',
+    })
+    users = []
+    for i in range(n_users):
+        app_db.create_user(f"Bench {i}", f"bench{i}@example.com", "secret1")
+        user_id = app_db.get_user_by_email(f"bench{i}@example.com")['id']
+        app_db.add_to_wallet(user_id, 10000.0, "seed")
+        users.append(user_id)
+    bookings = []
+    for i in range(n_bookings):
+        user_id = rnd.choice(users)
+        booking_id = app_db.create_booking(
+            user_id, STATION_ID, "2030-01-01", "10:00", 1.0,
+            float(rnd.randint(50, 500)),
+        )
+        bookings.append((booking_id, user_id))
+    return users, bookings
+
+
+def worker(ops: int, users, bookings, keys, results, seed_value: int):
+    rnd = random.Random(seed_value)
+    counts = {'deduct': 0, 'add': 0, 'cancel': 0, 'errors': 0}
+    cancels = []
+    for _ in range(ops):
+        user_id = rnd.choice(users)
+        amount = float(rnd.randint(1, 200))
+        # One call in five replays a key that other threads also use.
+        key = rnd.choice(keys) if rnd.random() < 0.2 else None
+        op = rnd.random()
+        try:
+            if op < 0.45:
+                app_db.deduct_from_wallet(
+                    user_id, amount, "bench debit",
+                    idempotency_key=key and f"debit:{user_id}:{key}",
+                )
+                counts['deduct'] += 1
+            elif op < 0.9:
+                app_db.add_to_wallet(
+                    user_id, amount, "bench credit",
+                    idempotency_key=key and f"credit:{user_id}:{key}",
+                )
+                counts['add'] += 1
+            else:
+                booking_id, owner = rnd.choice(bookings)
+                if app_db.cancel_booking(booking_id, owner):
+                    cancels.append(booking_id)
+                counts['cancel'] += 1
+        except Exception as e:
+            counts['errors'] += 1
+            print(f"error: {e!r}", file=sys.stderr)
+    results.append((counts, cancels))
+
+
+def violations(successful_cancels) -> list:
+    problems = []
+    with app_db.get_conn() as conn:
+        for user_id, balance, ledger in conn.execute(
+            """SELECT w.user_id, w.balance,
+                      (SELECT COALESCE(SUM(amount), 0) FROM wallet_transactions t
+                       WHERE t.user_id = w.user_id)
+               FROM wallets w"""
+        ):
+            if balance < -1e-9:
+                problems.append(f"user {user_id}: negative balance {balance}")
+            if abs(balance - ledger) > 1e-6:
+                problems.append(
+                    f"user {user_id}: balance {balance} != ledger {ledger}"
+                )
+        for key, n in conn.execute(
+            "SELECT idempotency_key, COUNT(*) FROM wallet_transactions "
+            "WHERE idempotency_key IS NOT NULL "
+            "GROUP BY idempotency_key HAVING COUNT(*) > 1"
+        ):
+            problems.append(f"idempotency key {key} applied {n} times")
+        refunds = dict(conn.execute(
+            "SELECT booking_id, COUNT(*) FROM wallet_transactions "
+            "WHERE transaction_type = 'credit' AND booking_id IS NOT NULL "
+            "GROUP BY booking_id"
+        ).fetchall())
+        cancelled = [r[0] for r in conn.execute(
+            "SELECT id FROM bookings WHERE booking_status = 'cancelled'"
+        )]
+    for booking_id in cancelled:
+        if refunds.get(booking_id, 0) != 1:
+            problems.append(f"booking {booking_id}: refunded "
+                            f"{refunds.get(booking_id, 0)} times")
+        if successful_cancels.count(booking_id) != 1:
+            problems.append(f"booking {booking_id}: cancel_booking succeeded "
+                            f"{successful_cancels.count(booking_id)} times")
+    return problems
+
+
+def phantom_booking(user_id: int) -> list:
+    """Try to book a station that does not exist; the wallet must not move."""
+    problems = []
+    before = app_db.get_wallet_balance(user_id)
+    try:
+        app_db.create_booking(user_id, "NO-SUCH-STATION", "2030-01-01",
+                              "10:00", 2.0, 200.0)
+        problems.append("create_booking accepted an unknown station")
+    except app_db.StationNotFoundError:
+        pass
+    after = app_db.get_wallet_balance(user_id)
+    if abs(after - before) > 1e-9:
+        problems.append(f"user {user_id}: unknown-station booking moved "
+                        f"the balance {before} -> {after}")
+    return problems
+
+
+def run(threads: int, ops: int, n_users: int, n_bookings: int) -> int:
+    rnd = random.Random(7)
+    users, bookings = seed(n_users, n_bookings, rnd)
+    keys = [f"k{i}" for i in range(max(ops // 10, 1))]
+    results = []
+    pool = [
+        threading.Thread(target=worker,
+                         args=(ops, users, bookings, keys, results, i))
+        for i in range(threads)
+    ]
+    began = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    totals = {'deduct': 0, 'add': 0, 'cancel': 0, 'errors': 0}
+    successful_cancels = []
+    for counts, cancels in results:
+        for k, v in counts.items():
+            totals[k] += v
+        successful_cancels.extend(cancels)
+    done = totals['deduct'] + totals['add'] + totals['cancel']
+
+    print(f"{threads} threads x {ops} ops against {n_users} wallets, "
+          f"{n_bookings} bookings")
+    print(f"  {done} ops in {elapsed:.2f}s: {done / elapsed:,.0f} ops/sec")
+    print(f"  deduct={totals['deduct']} add={totals['add']} "
+          f"cancel={totals['cancel']} errors={totals['errors']}")
+    print(f"  pool: {app_db.pool_stats()}")
+
+    problems = violations(successful_cancels) + phantom_booking(users[0])
+    for p in problems[:20]:
+        print(f"  VIOLATION {p}")
+    print(f"\n{len(problems)} invariant violation(s)")
+    return len(problems) + totals['errors']
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500,
+                        help="operations per thread")
+    parser.add_argument("--users", type=int, default=10,
+                        help="number of (hot) wallets")
+    parser.add_argument("--bookings", type=int, default=50,
+                        help="confirmed bookings available to cancel")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="ev_wallet_") as workdir:
+        app_db.DB_PATH = Path(workdir) / "wallet.db"
+        app_db.init_db()
+        failures = run(args.threads, args.ops, args.users, args.bookings)
+        app_db.close_pool()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
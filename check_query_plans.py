@@ -0,0 +1,277 @@
+"""Fail if any query issued by app_db falls back to a full table scan.
+
+Builds a throwaway database seeded with a few hundred thousand rows, calls
+every app_db helper against it while recording the SQL each one executes,
+and runs EXPLAIN QUERY PLAN on every recorded statement. Any ``SCAN <table>``
+step (a full pass, even one walking an index) is a failure unless the
+helper is listed in FULL_TABLE_READS. So is a statement EXPLAIN cannot plan.
+
+    python check_query_plans.py [--scale 1.0] [--verbose]
+"""
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import app_db
+
+# Helpers whose job is to read a whole table; a scan there is expected.
+FULL_TABLE_READS = {
+    'as_dataframe': 'loads the full station catalog into memory',
+    'get_all_users': 'admin listing of every user',
+    'get_all_bookings': 'admin listing of every booking',
+    'get_all_payment_requests': 'admin listing of every payment request',
+    'geocode_stations': 'batch job over every station and cached place',
+    '_facet_counts_sql': 'filter dropdown counts when the catalog cache is off',
+}
+
+# Scans we know about and have not fixed yet.
+KNOWN_SCANS = {}
+
+# A full pass over a table, whether in rowid order or walking an index.
+SCAN_RE = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+
+CITIES = ["New Delhi", "Mumbai", "Bengaluru", "Chennai", "Kolkata",
+          "Hyderabad", "Pune", "Ahmedabad", "Jaipur", "Lucknow"]
+OPERATORS = ["Tata Power", "Ather Grid", "ChargeZone", "Statiq", "Jio-bp",
+             "Zeon", "EESL"]
+
+
+def seed(conn, scale: float):
+    rnd = random.Random(42)
+    n = lambda base: max(10, int(base * scale))
+    n_stations, n_users = n(20000), n(5000)
+
+    stations = [
+        (f"STN{i:06d}", f"Station {i}", rnd.choice(OPERATORS), "State",
+         rnd.choice(CITIES), f"{110000 + i % 9000}", "CCS2",
+         rnd.randint(1, 10), "22;50", round(rnd.uniform(5, 35), 2), "Fixed",
+         "UPI", "24x7", "", "", round(rnd.uniform(1, 5), 1),
+         rnd.randint(0, 500), rnd.randint(0, 30), "", "Yes",
+         rnd.choice(["Yes", "No"]), "Mall", round(rnd.uniform(80, 100), 2),
+         rnd.choice(["Active", "Offline", "Maintenance"]),
+         rnd.uniform(8, 35), rnd.uniform(68, 97))
+        for i in range(n_stations)
+    ]
+    columns = [
+        'station_id', 'name', 'operator', 'state', 'city', 'pincode',
+        'charger_types', 'number_of_chargers', 'power_kW_each',
+        'price_per_kWh_INR', 'tariff_type', 'payment_methods', 'opening_hours',
+        'contact_number', 'email', 'station_rating', 'num_reviews',
+        'parking_spaces', 'amenities', 'reservation_supported',
+        'fast_charging_supported', 'nearby_landmark', 'uptime_percent',
+        'status', 'latitude', 'longitude',
+    ]
+    conn.executemany(
+        f"INSERT INTO ev_charging_stations_reduced ({', '.join(columns)}) "
+        f"VALUES ({','.join(['?'] * len(columns))})", stations
+    )
+    conn.executemany(
+        "INSERT INTO users (name, email, password_hash) VALUES (?, ?, ?)",
+        [(f"User {i}", f"user{i}@example.com", "x") for i in range(n_users)]
+    )
+    sid = lambda: f"STN{rnd.randrange(n_stations):06d}"
+    uid = lambda: rnd.randint(1, n_users)
+    day = lambda: f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+
+    conn.executemany(
+        "INSERT INTO reviews (station_id, user_id, rating, review_text, "
+        "created_at) VALUES (?, ?, ?, 'ok', ?)",
+        [(sid(), uid(), rnd.randint(1, 5), day()) for _ in range(n(100000))]
+    )
+    conn.executemany(
+        "INSERT INTO comments (station_id, user_id, comment_text, created_at) "
+        "VALUES (?, ?, 'hi', ?)",
+        [(sid(), uid(), day()) for _ in range(n(20000))]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO bookmarks (user_id, station_id) VALUES (?, ?)",
+        [(uid(), sid()) for _ in range(n(20000))]
+    )
+    conn.executemany(
+        "INSERT INTO search_history (user_id, search_term, search_filters, "
+        "created_at) VALUES (?, ?, '', ?)",
+        [(uid(), rnd.choice(CITIES), day()) for _ in range(n(50000))]
+    )
+    conn.executemany(
+        "INSERT INTO notifications (user_id, station_id, message, is_read, "
+        "created_at) VALUES (?, ?, 'msg', ?, ?)",
+        [(uid(), sid(), rnd.randint(0, 1), day()) for _ in range(n(100000))]
+    )
+    conn.executemany(
+        "INSERT INTO wallets (user_id, balance) VALUES (?, ?)",
+        [(u, 1000.0) for u in range(1, n_users + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO bookings (user_id, station_id, booking_date, "
+        "booking_time, duration_hours, total_amount, payment_status, "
+        "booking_status, created_at) VALUES (?, ?, ?, ?, ?, ?, 'paid', ?, ?)",
+        [(uid(), sid(), day(), f"{rnd.randint(0, 23):02d}:00",
+          rnd.choice([0.5, 1, 2]), 100.0,
+          rnd.choice(["confirmed", "cancelled"]), day())
+         for _ in range(n(100000))]
+    )
+    conn.executemany(
+        "INSERT INTO wallet_transactions (user_id, amount, transaction_type, "
+        "description, created_at) VALUES (?, ?, 'credit', '', ?)",
+        [(uid(), 100.0, day()) for _ in range(n(100000))]
+    )
+    conn.executemany(
+        "INSERT INTO payment_requests (user_id, amount, status, created_at) "
+        "VALUES (?, 500, ?, ?)",
+        [(uid(), rnd.choice(["pending", "approved", "rejected"]), day())
+         for _ in range(n(10000))]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def workload():
+    """(helper name, args, kwargs) covering every query in app_db."""
+    sid, uid = "STN000007", 7
+    return [
+        ('list_distinct', ('city',)),
+        ('list_distinct', ('operator',)),
+        ('list_distinct', ('status',)),
+        ('list_distinct', ('fast_charging_supported',)),
+        ('as_dataframe', ()),
+        ('_facet_counts_sql', (), {'city': 'Pune', 'price_min': 10}),
+        ('query_stations', (), {'price_min': 10, 'price_max': 11}),
+        ('query_stations', (), {'rating_min': 4.8}),
+        ('query_stations', (), {'city': 'Pune', 'status': 'Active'}),
+        ('get_station', (sid,)),
+        ('load_station_detail', (sid, uid)),
+        ('verify_user', ('user7@example.com', 'wrong')),
+        ('get_user_by_email', ('user7@example.com',)),
+        ('get_all_users', ()),
+        ('get_station_reviews', (sid,)),
+        ('get_user_reviews', (uid,)),
+        ('get_station_average_rating', (sid,)),
+        ('search_stations_by_location', ('Pune',)),
+        ('search_stations_by_location', ('new del 1100',)),
+        ('get_user_bookmarks', (uid,)),
+        ('is_bookmarked', (uid, sid)),
+        ('get_station_comments', (sid,)),
+        ('get_recent_searches', (uid,)),
+        ('get_user_notifications', (uid,)),
+        ('get_user_notifications', (uid, True)),
+        ('get_unread_count', (uid,)),
+        ('get_or_create_wallet', (uid,)),
+        ('get_wallet_balance', (uid,)),
+        ('get_wallet_transactions', (uid,)),
+        ('get_pending_payment_requests', ()),
+        ('get_all_payment_requests', ()),
+        ('get_user_payment_requests', (uid,)),
+        ('get_user_bookings', (uid,)),
+        ('get_user_charging_history', (uid,)),
+        ('get_all_bookings', ()),
+        ('is_slot_free', (sid, '2025-06-01', '10:00', 1.0)),
+        ('next_free_slots', (sid, '2025-06-01', '10:00', 1.0)),
+        # Writes
+        ('create_user', ('Plan Check', 'plan-check@example.com', 'secret1')),
+        ('add_review', (sid, uid, 4, 'fine')),
+        ('add_bookmark', (uid, sid)),
+        ('remove_bookmark', (uid, sid)),
+        ('add_comment', (sid, uid, 'hello')),
+        ('save_search_history', (uid, 'Pune', '')),
+        ('create_notification', (uid, 'hello', sid)),
+        ('notify_bookmark_holders', (sid, 'Back online')),
+        ('mark_notification_read', (1,)),
+        ('mark_all_notifications_read', (uid,)),
+        ('add_to_wallet', (uid, 500.0, 'top-up')),
+        ('deduct_from_wallet', (uid, 10.0, 'charge')),
+        ('create_payment_request', (uid, 250.0, 'TX1', 'UPI')),
+        ('approve_payment_request', (1, 'ok')),
+        ('reject_payment_request', (2, 'no')),
+        ('create_booking', (uid, sid, '2030-01-01', '10:00', 1.0, 50.0)),
+        ('cancel_booking', (1, uid)),
+        ('upsert_station', ({'station_id': sid, 'name': 'Renamed',
+                             'city': 'Pune', 'status': 'Offline'},)),
+        ('delete_station', ('STN000008',)),
+        ('geocode_stations', (['data/india_city_centroids.csv'],),
+         {'overwrite': True}),
+    ]
+
+
+def table_scans(conn, sql: str):
+    """(scan steps, all plan steps) of ``sql``. Raises sqlite3.Error if the
+    statement cannot be planned."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    details = [row[3] for row in plan]
+    return [d for d in details if SCAN_RE.match(d)], details
+
+
+def check(verbose: bool = False) -> int:
+    """Run the workload against the current DB_PATH; return failure count."""
+    statements = []
+    app_db.close_pool()
+    app_db.CONNECTION_HOOKS.append(
+        lambda c: c.set_trace_callback(statements.append)
+    )
+
+    failures, known, unexplained = 0, 0, 0
+    with app_db.get_conn() as explain_conn:
+        explain_conn.set_trace_callback(None)
+        for name, call_args, *rest in workload():
+            kwargs = rest[0] if rest else {}
+            del statements[:]
+            getattr(app_db, name)(*call_args, **kwargs)
+            seen = set()
+            for sql in statements:
+                head = sql.lstrip().split(None, 1)[0].upper()
+                if head not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE',
+                                'WITH') or sql in seen:
+                    continue
+                seen.add(sql)
+                try:
+                    scans, details = table_scans(explain_conn, sql)
+                except sqlite3.Error as e:
+                    # An unplanned statement is an unchecked one.
+                    unexplained += 1
+                    print(f"[FAIL] {name}: cannot explain ({e})")
+                    print(f"    {' '.join(sql.split())[:160]}")
+                    continue
+                if verbose:
+                    print(f"{name}: {' '.join(sql.split())[:100]}")
+                    for d in details:
+                        print(f"    {d}")
+                if not scans:
+                    continue
+                reason = FULL_TABLE_READS.get(name) or KNOWN_SCANS.get(name)
+                if name in KNOWN_SCANS:
+                    known += 1
+                elif not reason:
+                    failures += 1
+                print(f"[{'allowed' if reason else 'FAIL'}] {name}: "
+                      f"{', '.join(scans)}" + (f" ({reason})" if reason else ""))
+                print(f"    {' '.join(sql.split())[:160]}")
+    app_db.CONNECTION_HOOKS.pop()
+    app_db.close_pool()
+
+    print(f"\n{failures} unexpected table scan(s), {known} known, "
+          f"{unexplained} statement(s) that could not be explained")
+    return failures + unexplained
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier for seeded row counts")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print the plan of every statement")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="ev_plans_") as workdir:
+        app_db.DB_PATH = Path(workdir) / "plans.db"
+        app_db.init_db()
+        with app_db.get_conn() as conn:
+            seed(conn, args.scale)
+        failures = check(args.verbose)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,4 +20,10 @@ def create_app():
     from .routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from . import metrics
+    metrics.init_app(app)
+
+    from . import profiler
+    profiler.init_app(app)
+
     return app
@@ -0,0 +1,187 @@
+"""Per-request timing: SQL work (counted by app_db's instrumented
+connections), template rendering and total time.
+
+Each response carries a Server-Timing header, and RequestMetrics keeps
+per-route histograms that /admin/metrics exports in Prometheus text
+format alongside the pool, booking and catalog figures.
+"""
+import hmac
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import flask as f
+from flask import before_render_template, template_rendered
+
+from app_db import (
+    start_query_stats, stop_query_stats, pool_stats, booking_stats,
+    catalog_stats
+)
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Server-Timing exposes internals to every client; EV_SERVER_TIMING=0
+# turns the header off while still collecting metrics.
+SERVER_TIMING = os.environ.get("EV_SERVER_TIMING", "1") != "0"
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a label tuple."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.series: Dict[tuple, List[float]] = {}
+
+    def observe(self, labels: tuple, value: float):
+        # [bucket counts..., +Inf count, sum]
+        row = self.series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += 1
+        row[-1] += value
+
+    def lines(self, name: str, label_names: Tuple[str, ...]) -> List[str]:
+        out = [f"# TYPE {name} histogram"]
+        for labels, row in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            for bound, count in zip(self.buckets, row):
+                out.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+            out.append(f'{name}_bucket{{{base},le="+Inf"}} {row[-2]}')
+            out.append(f"{name}_sum{{{base}}} {row[-1]:.6f}")
+            out.append(f"{name}_count{{{base}}} {row[-2]}")
+        return out
+
+
+def _labels(names, values) -> str:
+    def escape(value) -> str:
+        return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+                .replace("\n", "\\n"))
+    return ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+
+
+class RequestMetrics:
+    """Request counts and duration/SQL/render histograms per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[tuple, int] = {}
+        self.queries: Dict[tuple, int] = {}
+        self.rows: Dict[tuple, int] = {}
+        self.duration = Histogram()
+        self.sql = Histogram()
+        self.render = Histogram()
+
+    def observe(self, route: str, method: str, status: int, total: float,
+                sql: float, render: float, queries: int, rows: int):
+        key = (route, method)
+        with self._lock:
+            status_key = (route, method, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.queries[key] = self.queries.get(key, 0) + queries
+            self.rows[key] = self.rows.get(key, 0) + rows
+            self.duration.observe(key, total)
+            self.sql.observe(key, sql)
+            self.render.observe(key, render)
+
+    def prometheus(self) -> List[str]:
+        route = ("route", "method")
+        with self._lock:
+            out = ["# TYPE ev_http_requests_total counter"]
+            out += [
+                f"ev_http_requests_total{{{_labels(route + ('status',), k)}}} {v}"
+                for k, v in sorted(self.requests.items())
+            ]
+            out.append("# TYPE ev_http_sql_queries_total counter")
+            out += [f"ev_http_sql_queries_total{{{_labels(route, k)}}} {v}"
+                    for k, v in sorted(self.queries.items())]
+            out.append("# TYPE ev_http_sql_rows_total counter")
+            out += [f"ev_http_sql_rows_total{{{_labels(route, k)}}} {v}"
+                    for k, v in sorted(self.rows.items())]
+            out += self.duration.lines("ev_http_request_duration_seconds", route)
+            out += self.sql.lines("ev_http_request_sql_seconds", route)
+            out += self.render.lines("ev_http_request_render_seconds", route)
+        return out
+
+
+request_metrics = RequestMetrics()
+
+
+def _gauges(prefix: str, stats: dict) -> List[str]:
+    return [
+        f"{prefix}_{key} {value}" for key, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+def prometheus_text() -> str:
+    """Everything /admin/metrics serves, in Prometheus text format."""
+    lines = request_metrics.prometheus()
+    lines += _gauges("ev_db_pool", pool_stats())
+    booking = booking_stats()
+    lines += _gauges("ev_booking", booking)
+    lines.append("# TYPE ev_booking_outcomes_total counter")
+    lines += [f'ev_booking_outcomes_total{{outcome="{k}"}} {v}'
+              for k, v in sorted(booking["outcomes"].items())]
+    lines += _gauges("ev_catalog", catalog_stats())
+    return "\n".join(lines) + "\n"
+
+
+def bearer_token_ok(env_var: str) -> bool:
+    """True if the request sends ``Authorization: Bearer $<env_var>``.
+    Unset or empty tokens never match."""
+    token = os.environ.get(env_var)
+    bearer = f.request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(bearer.encode(),
+                                               f"Bearer {token}".encode())
+
+
+def _start_request():
+    f.g.request_started = time.perf_counter()
+    f.g.render_seconds = 0.0
+    f.g.query_stats = start_query_stats()
+
+
+def _finish_request(response):
+    started = f.g.pop("request_started", None)
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    stop_query_stats()
+    stats = f.g.pop("query_stats")
+    render = f.g.pop("render_seconds", 0.0)
+    rule = f.request.url_rule
+    request_metrics.observe(
+        rule.rule if rule else "unmatched", f.request.method,
+        response.status_code, total, stats.seconds, render,
+        stats.queries, stats.rows,
+    )
+    if SERVER_TIMING:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.seconds * 1000:.2f};'
+            f'desc="{stats.queries} queries, {stats.rows} rows", '
+            f"render;dur={render * 1000:.2f}, total;dur={total * 1000:.2f}",
+        )
+    return response
+
+
+def _render_started(sender, template, context, **extra):
+    f.g.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    started = f.g.pop("render_started", None)
+    if started is not None:
+        f.g.render_seconds = f.g.get("render_seconds", 0.0) + (
+            time.perf_counter() - started
+        )
+
+
+def init_app(app):
+    """Time every request of ``app``."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
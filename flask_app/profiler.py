@@ -0,0 +1,241 @@
+"""On-demand request profiling.
+
+A request is profiled when an admin (or a client holding
+``Authorization: Bearer $EV_PROFILE_TOKEN``) sends ``X-EV-Profile: 1`` or
+``?_profile=1``, or when it is picked by 1-in-N sampling
+(``EV_PROFILE_SAMPLE``, or set on /admin/profiles; 0 turns it off).
+
+The request runs under cProfile with tracemalloc tracing allocations.
+Each profile leaves four files in ``EV_PROFILE_DIR`` (default
+``profiles/``), listed and downloadable from /admin/profiles:
+
+* ``<id>.prof``: pstats dump, for snakeviz, ``python -m pstats`` and the like
+* ``<id>.collapsed``: collapsed stacks (microseconds), for flamegraph.pl or speedscope
+* ``<id>.alloc.txt``: the top allocation sites by size
+* ``<id>.json``: request, status, timings and peak traced memory
+
+Only one request is profiled at a time. The others run normally rather
+than wait. tracemalloc is process-wide, so allocations made by concurrent
+requests are counted in the snapshot too.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import flask as f
+
+from .metrics import bearer_token_ok
+
+PROFILE_DIR = Path(os.environ.get("EV_PROFILE_DIR", "profiles"))
+PROFILE_KEEP = int(os.environ.get("EV_PROFILE_KEEP", "50"))
+PROFILE_HEADER = "X-EV-Profile"
+PROFILE_ARG = "_profile"
+# Allocation sites written to <id>.alloc.txt.
+ALLOC_TOP = 40
+# Call paths whose share of the time falls below this many microseconds are
+# left out of the collapsed stacks.
+COLLAPSED_MIN_US = 1
+FILE_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{6}\.(prof|collapsed|alloc\.txt|json)$")
+
+
+class Sampler:
+    """Picks one request in every ``every``. 0 picks none."""
+
+    def __init__(self, every: int):
+        self.every = every
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def pick(self) -> bool:
+        if self.every <= 0:
+            return False
+        with self._lock:
+            self._seen += 1
+            return self._seen % self.every == 0
+
+
+sampler = Sampler(int(os.environ.get("EV_PROFILE_SAMPLE", "0")))
+_busy = threading.Lock()
+
+
+def _requested() -> bool:
+    if not (f.request.headers.get(PROFILE_HEADER) == "1"
+            or f.request.args.get(PROFILE_ARG) == "1"):
+        return False
+    return bool(f.session.get("is_admin")) or bearer_token_ok("EV_PROFILE_TOKEN")
+
+
+def _label(code) -> str:
+    filename, line, name = code
+    if filename == "~":
+        return name  # builtins, e.g. "<built-in method time.sleep>"
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> List[str]:
+    """Approximate collapsed stacks from cProfile's caller/callee graph.
+
+    cProfile records only caller->callee edges, not full stacks. Each
+    function's time is therefore split across its call paths in proportion
+    to the cumulative time spent along each edge, the way flameprof does.
+    """
+    entries = stats.stats
+    children: Dict[tuple, Dict[tuple, float]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            children.setdefault(caller, {})[func] = edge[3]
+    totals: Dict[str, float] = {}
+
+    def walk(func, share: float, path: tuple, seen: frozenset):
+        _, _, own, cumulative, _ = entries[func]
+        if cumulative <= 0:
+            return
+        scale = share / cumulative
+        stack = path + (_label(func),)
+        own_us = own * scale * 1e6
+        if own_us >= COLLAPSED_MIN_US:
+            key = ";".join(stack)
+            totals[key] = totals.get(key, 0.0) + own_us
+        for child, edge_time in children.get(func, {}).items():
+            if child in seen or edge_time * scale * 1e6 < COLLAPSED_MIN_US:
+                continue
+            walk(child, edge_time * scale, stack, seen | {child})
+
+    for root in roots:
+        walk(root, entries[root][3], (), frozenset([root]))
+    return [f"{stack} {round(us)}" for stack, us in
+            sorted(totals.items(), key=lambda kv: -kv[1]) if round(us)]
+
+
+def _start():
+    requested = _requested()
+    if not (requested or sampler.pick()):
+        return
+    if not _busy.acquire(blocking=False):
+        return
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profile = cProfile.Profile()
+    f.g.profile = {
+        "profile": profile,
+        "started_tracing": started_tracing,
+        "trigger": "requested" if requested else "sampled",
+        "began": time.perf_counter(),
+        "memory_before": tracemalloc.get_traced_memory()[0],
+    }
+    profile.enable()
+
+
+def _stop(status: Optional[int]) -> Optional[str]:
+    state = f.g.pop("profile", None)
+    if state is None:
+        return None
+    state["profile"].disable()
+    try:
+        elapsed = time.perf_counter() - state["began"]
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*"),
+        ])
+        if state["started_tracing"]:
+            tracemalloc.stop()
+        return _save(state, status, elapsed, current, peak, snapshot)
+    finally:
+        _busy.release()
+
+
+def _save(state, status, elapsed, current, peak, snapshot) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    # Microsecond ids sort by time; _busy rules out two saves at once.
+    profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}"
+    base = PROFILE_DIR / profile_id
+    stats = pstats.Stats(state["profile"])
+    stats.dump_stats(f"{base}.prof")
+    Path(f"{base}.collapsed").write_text("\n".join(collapsed_stacks(stats)) + "\n")
+
+    top = snapshot.statistics("lineno")[:ALLOC_TOP]
+    Path(f"{base}.alloc.txt").write_text(
+        f"{f.request.method} {f.request.full_path.rstrip('?')}\n"
+        f"peak traced memory {peak / 1024:.1f} KiB, "
+        f"net change {(current - state['memory_before']) / 1024:+.1f} KiB\n\n"
+        + "\n".join(str(stat) for stat in top) + "\n"
+    )
+    Path(f"{base}.json").write_text(json.dumps({
+        "id": profile_id,
+        "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "method": f.request.method,
+        "path": f.request.full_path.rstrip("?"),
+        "route": f.request.url_rule.rule if f.request.url_rule else None,
+        "status": status,
+        "trigger": state["trigger"],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "calls": stats.total_calls,
+        "peak_kib": round(peak / 1024, 1),
+    }, indent=2))
+    _prune()
+    return profile_id
+
+
+def _prune():
+    """Keep the newest PROFILE_KEEP profiles."""
+    metas = sorted(PROFILE_DIR.glob("*.json"), reverse=True)
+    for meta in metas[PROFILE_KEEP:]:
+        profile_id = meta.name[:-len(".json")]
+        for suffix in (".json", ".prof", ".collapsed", ".alloc.txt"):
+            (PROFILE_DIR / (profile_id + suffix)).unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Saved profiles, newest first."""
+    if not PROFILE_DIR.is_dir():
+        return []
+    profiles = []
+    for meta in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        try:
+            profiles.append(json.loads(meta.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_file(name: str) -> Optional[Path]:
+    """Path of a saved profile file, or None for anything else."""
+    if not FILE_RE.match(name):
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
+
+
+def _finish_request(response):
+    profile_id = _stop(response.status_code)
+    if profile_id:
+        response.headers[PROFILE_HEADER] = profile_id
+    return response
+
+
+def _teardown(exc):
+    # after_request is skipped when the error handler itself fails.
+    if "profile" in f.g:
+        _stop(None)
+
+
+def init_app(app):
+    """Profile requests of ``app`` on demand. Call after metrics.init_app
+    so the profile nests inside the request timing."""
+    app.before_request(_start)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown)
@@ -1,27 +1,43 @@
+import json
+import math
 import os
+import zlib
+from functools import wraps
+from pathlib import Path
 import flask as f
+import pandas as pd
 from app_db import (
-    as_dataframe, list_distinct, upsert_station, delete_station,
+    as_dataframe, station_facets, upsert_station, delete_station,
+    get_station, load_station_detail, nearest_stations,
+    list_stations_page, station_summary, PAGE_SIZE,
     create_user, verify_user, get_user_by_email, get_all_users,
-    add_review, get_station_reviews, get_user_reviews,
-    get_station_average_rating, search_stations_by_location,
-    add_bookmark, remove_bookmark, get_user_bookmarks, is_bookmarked,
-    add_comment, get_station_comments,
+    add_review, get_user_reviews, search_stations_by_location,
+    add_bookmark, remove_bookmark, get_user_bookmarks, add_comment,
     save_search_history, get_recent_searches,
     create_notification, get_user_notifications, mark_notification_read,
-    get_unread_count,
+    get_unread_count, mark_all_notifications_read,
     get_or_create_wallet, get_wallet_balance, get_wallet_transactions,
     create_payment_request, get_pending_payment_requests,
     get_all_payment_requests, approve_payment_request, reject_payment_request,
     get_user_payment_requests,
     create_booking, get_user_bookings, get_all_bookings, cancel_booking,
-    get_user_charging_history
+    get_user_charging_history,
+    SlotUnavailableError, StationNotFoundError, is_slot_free, next_free_slots, query_tracer,
+    catalog_revision
 )
+from . import metrics, profiler
 
 
 bp = f.Blueprint("main", __name__)
 
 
+@bp.app_context_processor
+def inject_unread_notifications():
+    """Unread badge for the navbar; one counter-row lookup per page."""
+    user_id = f.session.get("user_id")
+    return {"unread_notifications": get_unread_count(user_id) if user_id else 0}
+
+
 @bp.route("/landing")
 def landing():
     return f.render_template("landing.html")
@@ -106,81 +122,125 @@ def home():
     return f.redirect(f.url_for("main.landing"))
 
 
+def _to_float(v):
+    """Finite float from a form or query value, else None."""
+    try:
+        value = float(v) if v not in (None, "") else None
+    except Exception:
+        return None
+    return value if value is None or math.isfinite(value) else None
+
+
+def _listing_filters(args):
+    """Station listing filters from request args, as as_dataframe kwargs."""
+    return dict(
+        city=args.get("city") or None,
+        operator=args.get("operator") or None,
+        status=args.get("status") or None,
+        fast=args.get("fast") or None,
+        price_min=_to_float(args.get("price_min")),
+        price_max=_to_float(args.get("price_max")),
+        rating_min=_to_float(args.get("rating_min")),
+        rating_max=_to_float(args.get("rating_max")),
+    )
+
+
+def _code_version() -> str:
+    root = Path(__file__).resolve().parent.parent
+    sources = sorted([root / "app_db.py", *Path(__file__).parent.glob("*.py"),
+                      *(root / "templates").rglob("*.html")])
+    crc = 0
+    for path in sources:
+        crc = zlib.crc32(path.read_bytes(), crc)
+    return format(crc, "08x")
+
+
+# Catalog ETags carry the code version next to the shared catalog
+# revision, so pages rendered before a deploy are not revalidated after it.
+CODE_VERSION = _code_version()
+
+
+def _catalog_etag():
+    """Strong ETag for a catalog-backed page, or None when the page has
+    per-viewer content (a signed-in user or admin, pending flash messages)
+    or the catalog cache is off."""
+    if (f.session.get("user_id") or f.session.get("is_admin")
+            or f.session.get("_flashes")):
+        return None
+    revision = catalog_revision()
+    return f"{revision}-{CODE_VERSION}-{f.request.endpoint}" if revision else None
+
+
+def conditional_catalog_get(view):
+    """Answer If-None-Match with 304 before the view touches the database,
+    and tag successful responses with the current catalog ETag."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Taken before the view runs: a write landing mid-render leaves
+        # the response tagged with the older revision, which only costs
+        # the client one extra full response.
+        etag = _catalog_etag()
+        if etag and f.request.if_none_match.contains_weak(etag):
+            response = f.Response(status=304)
+        else:
+            response = f.make_response(view(*args, **kwargs))
+            if not etag or response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Cookie")
+        return response
+    return wrapper
+
+
 @bp.route("/stations")
+@conditional_catalog_get
 def index():
     # Location search parameter
     location = f.request.args.get("location", "").strip()
-    
-    city = f.request.args.get("city") or None
-    operator = f.request.args.get("operator") or None
-    status = f.request.args.get("status") or None
-    fast = f.request.args.get("fast") or None
-    price_min = f.request.args.get("price_min")
-    price_max = f.request.args.get("price_max")
-    rating_min = f.request.args.get("rating_min")
-    rating_max = f.request.args.get("rating_max")
-
-    def _to_float(v):
-        try:
-            return float(v) if v not in (None, "") else None
-        except Exception:
-            return None
+    page_size = f.request.args.get("page_size", PAGE_SIZE, type=int)
+    after = f.request.args.get("after") or None
+    filters = _listing_filters(f.request.args)
     
     # Use location search if provided, otherwise use filters
     if location:
         df = search_stations_by_location(location)
+        total, next_cursor = len(df), None
         f.flash(f"Showing results for location: {location}", "info")
     else:
-        df = as_dataframe(
-            city, operator, status, fast,
-            price_min=_to_float(price_min), price_max=_to_float(price_max),
-            rating_min=_to_float(rating_min), rating_max=_to_float(rating_max)
-        )
+        page = list_stations_page(after, page_size, **filters)
+        df, total, next_cursor = page["rows"], page["total"], page["next"]
 
-    cities = list_distinct("city")
-    operators = list_distinct("operator")
-    statuses = list_distinct("status")
-    fast_opts = list_distinct("fast_charging_supported")
+    # Links for keyset navigation keep every other query argument
+    args = f.request.args.to_dict()
+    args.pop("after", None)
+    first_url = f.url_for("main.index", **args) if after else None
+    next_url = f.url_for("main.index", **args, after=next_cursor) if next_cursor else None
+
+    facets = station_facets(**filters)
     return f.render_template(
         "index.html",
         df=df,
-        cities=cities,
-        operators=operators,
-        statuses=statuses,
-        fast_opts=fast_opts,
-        selected_city=city,
-        selected_operator=operator,
-        selected_status=status,
-        selected_fast=fast,
-        price_min=price_min or "",
-        price_max=price_max or "",
-        rating_min=rating_min or "",
-        rating_max=rating_max or "",
+        total=total,
+        first_url=first_url,
+        next_url=next_url,
+        facets=facets,
+        selected_city=filters["city"],
+        selected_operator=filters["operator"],
+        selected_status=filters["status"],
+        selected_fast=filters["fast"],
+        price_min=f.request.args.get("price_min") or "",
+        price_max=f.request.args.get("price_max") or "",
+        rating_min=f.request.args.get("rating_min") or "",
+        rating_max=f.request.args.get("rating_max") or "",
         location=location
     )
-    return f.render_template(
-        "index.html",
-        df=df,
-        cities=cities,
-        operators=operators,
-        statuses=statuses,
-        fast_opts=fast_opts,
-        selected_city=city,
-        selected_operator=operator,
-        selected_status=status,
-        selected_fast=fast,
-        price_min=price_min or "",
-        price_max=price_max or "",
-        rating_min=rating_min or "",
-        rating_max=rating_max or "",
-    )
 
 
 @bp.route("/analytics")
+@conditional_catalog_get
 def analytics():
-    df = as_dataframe()
-    records = df.to_dict(orient="records")
-    return f.render_template("analytics.html", rows=records)
+    return f.render_template("analytics.html", summary=station_summary())
 
 
 @bp.route("/admin/login", methods=["GET", "POST"])
@@ -262,8 +322,11 @@ def admin_stations():
                 ),
                 "status": form.get("status", "Active"),
             }
-            upsert_station(payload)
+            notified = upsert_station(payload)
             f.flash(f"Saved station {station_id}", "success")
+            if notified:
+                f.flash(f"Notified {notified} user(s) who bookmarked it "
+                        "of the status change", "info")
         except Exception as e:
             f.flash(f"Save failed: {e}", "danger")
         return f.redirect(f.url_for("main.admin_stations"))
@@ -289,35 +352,15 @@ def admin_delete_station():
 
 
 @bp.route("/station/<station_id>")
+@conditional_catalog_get
 def station_detail(station_id: str):
-    df = as_dataframe()
-    row = None
-    for r in df.to_dict(orient="records"):
-        if r.get("station_id") == station_id:
-            row = r
-            break
-    if not row:
+    # Station row, reviews, comments, rating and bookmark flag in one read
+    detail = load_station_detail(station_id, f.session.get("user_id"))
+    if not detail:
         f.flash("Station not found", "warning")
         return f.redirect(f.url_for("main.index"))
     
-    # Get reviews and comments for this station
-    reviews = get_station_reviews(station_id)
-    comments = get_station_comments(station_id)
-    avg_rating = get_station_average_rating(station_id)
-    
-    # Check if bookmarked (for logged-in users)
-    bookmarked = False
-    if f.session.get("user_id"):
-        bookmarked = is_bookmarked(f.session.get("user_id"), station_id)
-    
-    return f.render_template(
-        "station_detail.html",
-        row=row,
-        reviews=reviews,
-        comments=comments,
-        avg_rating=avg_rating,
-        bookmarked=bookmarked
-    )
+    return f.render_template("station_detail.html", **detail)
 
 
 @bp.route("/station/<station_id>/review", methods=["POST"])
@@ -477,10 +520,89 @@ def mark_read(notification_id: int):
     if not f.session.get("user_id"):
         return f.redirect(f.url_for("main.user_login"))
     
-    mark_notification_read(notification_id)
+    mark_notification_read(notification_id, f.session.get("user_id"))
     return f.redirect(f.url_for("main.user_notifications_page"))
 
 
+@bp.route("/notifications/read-all", methods=["POST"])
+def mark_all_read():
+    """Mark every notification of the current user as read."""
+    if not f.session.get("user_id"):
+        return f.redirect(f.url_for("main.user_login"))
+    
+    mark_all_notifications_read(f.session.get("user_id"))
+    return f.redirect(f.url_for("main.user_notifications_page"))
+
+
+@bp.route("/admin/metrics")
+def admin_metrics():
+    """Prometheus metrics. Scrapers authenticate with the
+    ``Authorization: Bearer $EV_METRICS_TOKEN`` header instead of a session."""
+    if not f.session.get("is_admin") and not metrics.bearer_token_ok("EV_METRICS_TOKEN"):
+        f.abort(403)
+    return f.Response(metrics.prometheus_text(),
+                      mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/admin/queries", methods=["GET", "POST"])
+def admin_queries():
+    """Per-fingerprint SQL statistics and the slow-query log (admin only)."""
+    if not require_admin():
+        return f.redirect(f.url_for("main.admin_login"))
+    if f.request.method == "POST":
+        action = f.request.form.get("action")
+        if action == "reset":
+            query_tracer.reset()
+            f.flash("Query statistics cleared", "success")
+        else:
+            try:
+                query_tracer.slow_ms = max(float(f.request.form.get("slow_ms", "")), 0.0)
+            except ValueError:
+                f.flash("Slow-query threshold must be a number of milliseconds", "danger")
+                return f.redirect(f.url_for("main.admin_queries"))
+            query_tracer.enabled = f.request.form.get("enabled") == "on"
+            f.flash("Query tracing " + ("enabled" if query_tracer.enabled else "disabled"),
+                    "success")
+        return f.redirect(f.url_for("main.admin_queries"))
+    return f.render_template(
+        "admin_queries.html", tracer=query_tracer,
+        fingerprints=query_tracer.stats(), slow=query_tracer.slow_queries(),
+    )
+
+
+@bp.route("/admin/profiles", methods=["GET", "POST"])
+def admin_profiles():
+    """Saved request profiles and the sampling rate (admin only)."""
+    if not require_admin():
+        return f.redirect(f.url_for("main.admin_login"))
+    if f.request.method == "POST":
+        try:
+            every = int(f.request.form.get("sample_every", ""))
+        except ValueError:
+            f.flash("Sampling rate must be a whole number", "danger")
+            return f.redirect(f.url_for("main.admin_profiles"))
+        profiler.sampler.every = max(every, 0)
+        f.flash(f"Profiling 1 in {every} requests" if every > 0
+                else "Sampled profiling disabled", "success")
+        return f.redirect(f.url_for("main.admin_profiles"))
+    return f.render_template("admin_profiles.html", profiles=profiler.list_profiles(),
+                             sampler=profiler.sampler, header=profiler.PROFILE_HEADER,
+                             arg=profiler.PROFILE_ARG)
+
+
+@bp.route("/admin/profiles/<name>")
+def admin_profile_file(name):
+    """Download one profile file (admin only)."""
+    if not require_admin():
+        return f.redirect(f.url_for("main.admin_login"))
+    path = profiler.profile_file(name)
+    if path is None:
+        f.abort(404)
+    return f.send_file(path.resolve(), as_attachment=True, download_name=name,
+                       mimetype="application/octet-stream"
+                       if name.endswith(".prof") else "text/plain")
+
+
 @bp.route("/admin/users")
 def admin_users():
     """View all registered users (admin only)."""
@@ -591,32 +713,44 @@ def book_station(station_id: str):
     if f.request.method == "POST":
         booking_date = f.request.form.get("booking_date")
         booking_time = f.request.form.get("booking_time")
-        duration = float(f.request.form.get("duration", 1))
-        charger_power = float(f.request.form.get("charger_power", 0))
+        duration = _to_float(f.request.form.get("duration", 1)) or 0
+        charger_power = _to_float(f.request.form.get("charger_power", 0)) or 0
         
         if charger_power <= 0:
             f.flash("Please select a charger power", "warning")
             return f.redirect(f.url_for("main.book_station", station_id=station_id))
         
         # Get station details to calculate price
-        df = as_dataframe()
-        station = df[df['station_id'] == station_id].iloc[0] if len(df) > 0 else None
+        station = get_station(station_id)
+        if station is None:
+            f.flash("Station not found", "warning")
+            return f.redirect(f.url_for("main.index"))
         
-        if station is not None:
-            try:
-                price_per_kwh = float(station['price_per_kWh_INR'])
-                # Use the user-selected charger power
-                total_amount = price_per_kwh * charger_power * duration
-            except Exception as e:
-                print(f"Error calculating cost: {e}")
-                total_amount = 100.0 * duration
-        else:
+        try:
+            price_per_kwh = float(station['price_per_kWh_INR'])
+            # Use the user-selected charger power
+            total_amount = price_per_kwh * charger_power * duration
+        except Exception as e:
+            print(f"Error calculating cost: {e}")
             total_amount = 100.0 * duration
         
-        booking_id = create_booking(
-            user_id, station_id, booking_date, 
-            booking_time, duration, total_amount
-        )
+        try:
+            booking_id = create_booking(
+                user_id, station_id, booking_date, 
+                booking_time, duration, total_amount
+            )
+        except SlotUnavailableError as e:
+            suggestions = ", ".join(f"{d} {t}" for d, t in e.next_slots)
+            f.flash("All chargers are booked for that time."
+                    + (f" Next free slots: {suggestions}" if suggestions else ""),
+                    "warning")
+            return f.redirect(f.url_for("main.book_station", station_id=station_id))
+        except StationNotFoundError:
+            f.flash("Station not found", "warning")
+            return f.redirect(f.url_for("main.index"))
+        except ValueError:
+            f.flash("Invalid booking date, time or duration", "danger")
+            return f.redirect(f.url_for("main.book_station", station_id=station_id))
         
         if booking_id:
             f.flash(f"Booking confirmed! ₹{total_amount:.2f} deducted.", "success")
@@ -627,8 +761,10 @@ def book_station(station_id: str):
     
     # GET request - show booking form
     from datetime import datetime
-    df = as_dataframe()
-    station = df[df['station_id'] == station_id].to_dict('records')[0] if len(df) > 0 else None
+    station = get_station(station_id)
+    if not station:
+        f.flash("Station not found", "warning")
+        return f.redirect(f.url_for("main.index"))
     wallet_balance = get_wallet_balance(user_id)
     
     return f.render_template("book_station.html", 
@@ -692,3 +828,183 @@ def admin_bookings():
     bookings = get_all_bookings()
     return f.render_template("admin_bookings.html", bookings=bookings)
 
+
+# ==================== API Routes ====================
+
+NEAREST_FIELDS = [
+    "station_id", "name", "operator", "city", "state", "status",
+    "price_per_kWh_INR", "fast_charging_supported", "latitude", "longitude",
+    "distance_km",
+]
+
+
+PAGE_FIELDS = [
+    "station_id", "name", "city", "operator", "price_per_kWh_INR", "status",
+]
+
+
+def _records(df):
+    """DataFrame rows as JSON-safe dicts (NaN becomes null)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+@bp.route("/api/stations/nearest")
+def api_nearest_stations():
+    """k nearest stations to a point, combinable with the listing filters."""
+    args = f.request.args
+    lat = args.get("lat", type=float)
+    lng = args.get("lng", type=float)
+    if lat is None or lng is None or not (
+        -90 <= lat <= 90 and -180 <= lng <= 180
+    ):
+        return f.jsonify({"error": "lat and lng must be valid coordinates"}), 400
+    k = min(max(args.get("k", 10, type=int), 1), 100)
+    radius_km = args.get("radius_km", type=float)
+
+    df = nearest_stations(
+        lat, lng, k=k, radius_km=radius_km,
+        city=args.get("city") or None,
+        operator=args.get("operator") or None,
+        status=args.get("status") or None,
+        fast=args.get("fast") or None,
+    )
+    return f.jsonify({"count": len(df), "stations": _records(df[NEAREST_FIELDS])})
+
+
+@bp.route("/api/stations/page")
+def api_stations_page():
+    """One keyset page of the station listing (feeds the table view)."""
+    args = f.request.args
+    location = args.get("location", "").strip()
+    if location:
+        df = search_stations_by_location(location)
+        total, next_cursor = len(df), None
+    else:
+        page = list_stations_page(
+            args.get("after") or None,
+            args.get("page_size", PAGE_SIZE, type=int),
+            **_listing_filters(args),
+        )
+        df, total, next_cursor = page["rows"], page["total"], page["next"]
+    return f.jsonify({
+        "total": total,
+        "next": next_cursor,
+        "stations": _records(df[PAGE_FIELDS]),
+    })
+
+
+# Field name -> (column, decimals for numeric fields) for /api/stations.
+COLUMNAR_FIELDS = {
+    "id": ("station_id", None),
+    "name": ("name", None),
+    "operator": ("operator", None),
+    "city": ("city", None),
+    "state": ("state", None),
+    "lat": ("latitude", 5),
+    "lng": ("longitude", 5),
+    "price": ("price_per_kWh_INR", 2),
+    "rating": ("avg_rating", 2),
+    "status": ("status", None),
+    "fast": ("fast_charging_supported", None),
+}
+COLUMNAR_DEFAULT_FIELDS = ["id", "lat", "lng", "price", "status"]
+# Values serialized per chunk of the streamed response.
+COLUMNAR_CHUNK = 5000
+
+
+def _columnar_json(df, fields):
+    """Stream ``{"count", "fields", "columns": {field: [...]}}`` for ``df``,
+    one slice of one column at a time, so no per-row objects are built."""
+    yield json.dumps({"count": len(df), "fields": fields},
+                     separators=(",", ":"))[:-1] + ',"columns":{'
+    for i, field in enumerate(fields):
+        column, digits = COLUMNAR_FIELDS[field]
+        values = df[column]
+        if digits is not None:
+            values = pd.to_numeric(values, errors="coerce").round(digits)
+        yield ("," if i else "") + f'"{field}":['
+        for start in range(0, len(values), COLUMNAR_CHUNK):
+            part = values.iloc[start:start + COLUMNAR_CHUNK]
+            part = part.astype(object).where(part.notna(), None).tolist()
+            yield ("," if start else "") + json.dumps(
+                part, separators=(",", ":"))[1:-1]
+        yield "]"
+    yield "}}"
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@bp.route("/api/stations")
+def api_stations():
+    """Every station matching the listing filters (or a location search),
+    as parallel arrays: ``columns.id[i]``, ``columns.lat[i]``... describe
+    station i. ``fields`` picks the arrays (default: id, lat, lng, price,
+    status). Gzip-compressed when the client accepts it, and answered with
+    304 while the catalog and the request are unchanged."""
+    args = f.request.args
+    fields = [
+        name.strip() for name in args.get("fields", "").split(",") if name.strip()
+    ] or COLUMNAR_DEFAULT_FIELDS
+    unknown = [name for name in fields if name not in COLUMNAR_FIELDS]
+    if unknown:
+        return f.jsonify(error=f"unknown field(s): {', '.join(unknown)}",
+                         fields=list(COLUMNAR_FIELDS)), 400
+    gzip = f.request.accept_encodings["gzip"] > 0
+
+    # The payload is the same for every viewer, so unlike the HTML pages
+    # the ETag only varies with the encoding.
+    revision = catalog_revision()
+    etag = (f"{revision}-{CODE_VERSION}-api-{'gzip' if gzip else 'identity'}"
+            if revision else None)
+    if etag and f.request.if_none_match.contains_weak(etag):
+        response = f.Response(status=304)
+    else:
+        location = args.get("location", "").strip()
+        if location:
+            df = search_stations_by_location(location)
+        else:
+            df = as_dataframe(**_listing_filters(args))
+        body = _columnar_json(df, fields)
+        response = f.Response(_gzip_stream(body) if gzip else body,
+                              mimetype="application/json")
+        if gzip:
+            response.headers["Content-Encoding"] = "gzip"
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@bp.route("/api/analytics")
+def api_analytics():
+    return f.jsonify(station_summary())
+
+
+@bp.route("/api/stations/<station_id>/slots")
+def api_station_slots(station_id: str):
+    """Whether the requested slot is free, plus the next free starts."""
+    args = f.request.args
+    try:
+        booking_date, booking_time = args["date"], args.get("time", "00:00")
+        duration = float(args.get("duration", 1))
+        free = is_slot_free(station_id, booking_date, booking_time, duration)
+        count = min(max(args.get("count", 5, type=int), 1), 50)
+        slots = next_free_slots(station_id, booking_date, booking_time,
+                                duration, count=count)
+    except StationNotFoundError:
+        return f.jsonify(error="station not found"), 404
+    except (KeyError, ValueError):
+        return f.jsonify(error="date (YYYY-MM-DD), time (HH:MM) and a "
+                               "duration in hours are required"), 400
+    return f.jsonify(
+        free=free,
+        next_slots=[{"date": d, "time": t} for d, t in slots],
+    )
@@ -0,0 +1,382 @@
+"""Fill a database with a large, production-shaped synthetic dataset.
+
+Generates stations scattered around the city centroids in
+data/india_city_centroids.csv, plus users, reviews, comments, bookmarks,
+bookings with their wallet ledger, notifications and search history.
+Station popularity is skewed, so a few stations draw most of the activity,
+as in real traffic. The same seed always produces the same data.
+
+Rows are bulk inserted with indexes and triggers dropped, then init_db
+recreates them and rebuilds the search index, rating aggregates and
+unread counters in one pass. Every generated user can log in with
+password ``password1``; wallet balances always equal their ledger.
+
+    python generate_dataset.py [--scale 1.0] [--seed 42] [--db path] [--force]
+    python generate_dataset.py --stations 100000 --bookings 1000000
+"""
+import argparse
+import hashlib
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import app_db
+
+CENTROIDS = Path("data/india_city_centroids.csv")
+DEFAULT_PASSWORD = "password1"
+CHUNK = 50000
+# Timestamps are relative to a fixed date so a seed always yields the
+# same rows: history runs up to a year before it, bookings to 60 days after.
+ANCHOR = np.datetime64('2025-06-30T00:00:00')
+
+# Row counts at --scale 1.0
+VOLUMES = {
+    'stations': 100_000,
+    'users': 50_000,
+    'reviews': 500_000,
+    'comments': 100_000,
+    'bookmarks': 200_000,
+    'bookings': 1_000_000,
+    'notifications': 500_000,
+    'searches': 300_000,
+}
+
+# Three-digit pincode prefixes (sorting districts) of the centroid cities.
+PINCODE_PREFIXES = {
+    'New Delhi': 110, 'Mumbai': 400, 'Bengaluru': 560, 'Chennai': 600,
+    'Kolkata': 700, 'Hyderabad': 500, 'Pune': 411, 'Ahmedabad': 380,
+    'Jaipur': 302, 'Lucknow': 226, 'Surat': 395, 'Vadodara': 390,
+    'Kanpur': 208, 'Agra': 282, 'Varanasi': 221, 'Noida': 201,
+    'Gurugram': 122, 'Chandigarh': 160, 'Ludhiana': 141, 'Amritsar': 143,
+    'Dehradun': 248, 'Nagpur': 440, 'Nashik': 422, 'Indore': 452,
+    'Bhopal': 462, 'Raipur': 492, 'Patna': 800, 'Ranchi': 834,
+    'Bhubaneswar': 751, 'Guwahati': 781, 'Visakhapatnam': 530,
+    'Vijayawada': 520, 'Mysuru': 570, 'Coimbatore': 641, 'Madurai': 625,
+    'Kochi': 682, 'Thiruvananthapuram': 695, 'Panaji': 403,
+}
+# The eight metros carry most stations.
+METROS = {'New Delhi', 'Mumbai', 'Bengaluru', 'Chennai', 'Kolkata',
+          'Hyderabad', 'Pune', 'Ahmedabad'}
+
+OPERATORS = ['Tata Power', 'Ather Grid', 'ChargeZone', 'Statiq', 'Jio-bp',
+             'Zeon', 'EESL', 'Fortum', 'Magenta ChargeGrid', 'Relux']
+CHARGER_TYPES = ['AC Type2', 'CCS2', 'CHAdeMO', 'Bharat AC001',
+                 'Bharat DC001', 'CCS2;AC Type2', 'CCS2;CHAdeMO']
+POWER = ['3.3', '7.4', '11;22', '22', '25;50', '50', '60;120', '3.3;22;11;11']
+PAYMENT = ['UPI', 'UPI;Credit Card', 'UPI;Credit Card;Wallet', 'Cash;UPI',
+           'Wallet']
+HOURS = ['24x7', '06:00-22:00', '08:00-20:00', '07:00-23:00']
+AMENITIES = ['Waiting Area', 'Restroom', 'Cafe', 'Restroom;Cafe', 'Wi-Fi',
+             'Restroom;Waiting Area;Wi-Fi', '']
+LANDMARKS = ['Mall', 'Metro Station', 'Highway', 'Petrol Pump', 'Hospital',
+             'Office Park', 'Hotel', 'Market']
+STATUSES = ['Active', 'Offline', 'Maintenance']
+COMMENTS = ['Chargers working fine today', 'Long queue in the evening',
+            'Parking is easy', 'One charger out of order', 'Staff helpful',
+            'Cafe nearby while you wait', 'Cleaner than most']
+REVIEWS = ['Great experience', 'Fast and reliable', 'Average', 'Slow charging',
+           'Hard to find the entrance', 'Would come again', '']
+NOTIFICATIONS = ['Booking confirmed!', 'Station is now Active',
+                 'Station is now Offline', 'Your payment was approved',
+                 'New review on a bookmarked station']
+
+
+def timestamps(rnd, n: int, days_before: int, days_after: int = 0) -> np.ndarray:
+    """n 'YYYY-MM-DD HH:MM:SS' strings spread around ANCHOR."""
+    seconds = rnd.integers(-days_before * 86400, days_after * 86400 + 1, n)
+    stamps = np.datetime_as_string(ANCHOR + seconds.astype('timedelta64[s]'),
+                                   unit='s')
+    return np.char.replace(stamps, 'T', ' ')
+
+
+def popularity(rnd, n: int, skew: float = 0.8) -> np.ndarray:
+    """Selection probabilities with a long tail: a few items are hot."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    rnd.shuffle(weights)
+    return weights / weights.sum()
+
+
+def insert(conn, table: str, columns: dict, label: str = None):
+    """executemany the column arrays into table, CHUNK rows per commit."""
+    names = list(columns)
+    n = len(next(iter(columns.values())))
+    sql = (f"INSERT INTO {table} ({', '.join(names)}) "
+           f"VALUES ({', '.join(['?'] * len(names))})")
+    began = time.perf_counter()
+    for start in range(0, n, CHUNK):
+        chunk = [
+            (col[start:start + CHUNK].tolist() if isinstance(col, np.ndarray)
+             else list(col[start:start + CHUNK]))
+            for col in columns.values()
+        ]
+        conn.executemany(sql, zip(*chunk))
+        conn.commit()
+    elapsed = time.perf_counter() - began
+    print(f"  {label or table:<20}{n:>12,} rows  "
+          f"{n / elapsed if elapsed else 0:>10,.0f} rows/sec")
+
+
+def stations(conn, rnd, n: int) -> pd.DataFrame:
+    cities = pd.read_csv(CENTROIDS)
+    cities = cities[cities['city'].isin(PINCODE_PREFIXES)].reset_index(drop=True)
+    weight = np.where(cities['city'].isin(METROS), 6.0, 1.0)
+    city = rnd.choice(len(cities), n, p=weight / weight.sum())
+    ids = np.array([f"STN{i:07d}" for i in range(1, n + 1)], dtype=object)
+    names_ = cities['city'].to_numpy(dtype=object)[city]
+    prefix = cities['city'].map(PINCODE_PREFIXES).to_numpy()[city]
+    price = np.round(rnd.uniform(8, 30, n), 2)
+    frame = pd.DataFrame({
+        'station_id': ids,
+        'name': names_ + ' EV Charging Station ' + np.arange(1, n + 1).astype(str).astype(object),
+        'operator': rnd.choice(OPERATORS, n),
+        'state': cities['state'].to_numpy(dtype=object)[city],
+        'city': names_,
+        'pincode': (prefix * 1000 + rnd.integers(1, 100, n)).astype(str),
+        'charger_types': rnd.choice(CHARGER_TYPES, n),
+        'number_of_chargers': rnd.integers(1, 11, n),
+        'power_kW_each': rnd.choice(POWER, n),
+        'price_per_kWh_INR': price,
+        'tariff_type': rnd.choice(['Fixed', 'Time of Day', 'Dynamic'], n,
+                                  p=[0.6, 0.3, 0.1]),
+        'payment_methods': rnd.choice(PAYMENT, n),
+        'opening_hours': rnd.choice(HOURS, n, p=[0.55, 0.15, 0.15, 0.15]),
+        'contact_number': np.char.add('+91', rnd.integers(7_000_000_000, 9_999_999_999, n).astype(str)),
+        'email': np.char.add(np.char.add('contact', np.arange(1, n + 1).astype(str)), '@example-ev.com'),
+        'station_rating': np.round(np.clip(rnd.normal(3.9, 0.6, n), 1, 5), 1),
+        'num_reviews': rnd.integers(0, 500, n),
+        'parking_spaces': rnd.integers(2, 60, n),
+        'amenities': rnd.choice(AMENITIES, n),
+        'reservation_supported': rnd.choice(['Yes', 'No'], n),
+        'fast_charging_supported': rnd.choice(['Yes', 'No'], n, p=[0.45, 0.55]),
+        'nearby_landmark': rnd.choice(LANDMARKS, n),
+        'uptime_percent': np.round(rnd.uniform(80, 100, n), 2),
+        'status': rnd.choice(STATUSES, n, p=[0.8, 0.12, 0.08]),
+        # ~5 km scatter around the centre (0.045 degrees)
+        'latitude': np.round(cities['latitude'].to_numpy()[city]
+                             + rnd.normal(0, 0.045, n), 6),
+        'longitude': np.round(cities['longitude'].to_numpy()[city]
+                              + rnd.normal(0, 0.045, n), 6),
+    })
+    insert(conn, 'ev_charging_stations_reduced',
+           {c: frame[c].to_numpy() for c in app_db.STATION_IMPORT_COLUMNS},
+           'stations')
+    return frame
+
+
+def password_hash(rnd, password: str, iterations: int = 600000) -> str:
+    """werkzeug-compatible pbkdf2 hash with a seeded salt (werkzeug's own
+    generate_password_hash salts randomly, which breaks reproducibility)."""
+    salt = ''.join(rnd.choice(list('abcdefghijklmnopqrstuvwxyz0123456789'), 16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(),
+                                 iterations).hex()
+    return f"pbkdf2:sha256:{iterations}${salt}${digest}"
+
+
+def users(conn, rnd, n: int):
+    hashed = password_hash(rnd, DEFAULT_PASSWORD)
+    seq = np.arange(n).astype(str).astype(object)
+    insert(conn, 'users', {
+        'name': 'User ' + seq,
+        'email': 'user' + seq + '@example.com',
+        'password_hash': np.full(n, hashed, dtype=object),
+        'created_at': timestamps(rnd, n, 400, -30),
+    })
+
+
+def activity(conn, rnd, volumes: dict, station_frame: pd.DataFrame):
+    n_users = volumes['users']
+    station_ids = station_frame['station_id'].to_numpy()
+    hot = popularity(rnd, len(station_ids))
+    pick_station = lambda n: station_ids[rnd.choice(len(station_ids), n, p=hot)]
+    pick_user = lambda n: rnd.integers(1, n_users + 1, n)
+
+    n = volumes['reviews']
+    insert(conn, 'reviews', {
+        'station_id': pick_station(n),
+        'user_id': pick_user(n),
+        'rating': rnd.choice([1, 2, 3, 4, 5], n, p=[.05, .08, .17, .35, .35]),
+        'review_text': rnd.choice(REVIEWS, n),
+        'created_at': timestamps(rnd, n, 365),
+    })
+
+    n = volumes['comments']
+    insert(conn, 'comments', {
+        'station_id': pick_station(n),
+        'user_id': pick_user(n),
+        'comment_text': rnd.choice(COMMENTS, n),
+        'created_at': timestamps(rnd, n, 365),
+    })
+
+    # Unique (user, station) pairs
+    n = volumes['bookmarks']
+    index = {s: i for i, s in enumerate(station_ids)}
+    pairs = np.unique(np.stack([
+        pick_user(n),
+        np.fromiter((index[s] for s in pick_station(n)), dtype=np.int64, count=n),
+    ], axis=1), axis=0)
+    insert(conn, 'bookmarks', {
+        'user_id': pairs[:, 0],
+        'station_id': station_ids[pairs[:, 1]],
+        'created_at': timestamps(rnd, len(pairs), 365),
+    })
+
+    n = volumes['searches']
+    terms = np.concatenate([station_frame['city'].unique(), OPERATORS])
+    insert(conn, 'search_history', {
+        'user_id': pick_user(n),
+        'search_term': rnd.choice(terms, n),
+        'search_filters': np.full(n, '', dtype=object),
+        'created_at': timestamps(rnd, n, 365),
+    }, 'search history')
+
+    n = volumes['notifications']
+    insert(conn, 'notifications', {
+        'user_id': pick_user(n),
+        'station_id': pick_station(n),
+        'message': rnd.choice(NOTIFICATIONS, n),
+        'is_read': (rnd.random(n) < 0.6).astype(int),
+        'created_at': timestamps(rnd, n, 365),
+    })
+
+
+def bookings(conn, rnd, volumes: dict, station_frame: pd.DataFrame):
+    """Bookings plus the wallet ledger they imply: one top-up per user
+    covering their spend, a debit per booking and a refund per cancelled
+    one, so every balance equals the sum of its ledger."""
+    n, n_users = volumes['bookings'], volumes['users']
+    hot = popularity(rnd, len(station_frame))
+    station = rnd.choice(len(station_frame), n, p=hot)
+    user = rnd.integers(1, n_users + 1, n)
+    duration = rnd.choice([0.5, 1.0, 1.5, 2.0, 3.0], n, p=[.2, .4, .15, .15, .1])
+    amount = np.round(
+        station_frame['price_per_kWh_INR'].to_numpy()[station]
+        * rnd.choice([7.4, 22.0, 50.0], n, p=[.3, .5, .2]) * duration, 2)
+    cancelled = rnd.random(n) < 0.15
+    day = ANCHOR.astype('datetime64[D]') + rnd.integers(-180, 61, n)
+    created = timestamps(rnd, n, 200)
+    insert(conn, 'bookings', {
+        'user_id': user,
+        'station_id': station_frame['station_id'].to_numpy()[station],
+        'booking_date': np.datetime_as_string(day),
+        'booking_time': np.char.add(
+            np.char.zfill(rnd.integers(6, 23, n).astype(str), 2),
+            rnd.choice([':00', ':30'], n)),
+        'duration_hours': duration,
+        'total_amount': amount,
+        'payment_status': np.full(n, 'paid', dtype=object),
+        'booking_status': np.where(cancelled, 'cancelled', 'confirmed'),
+        'created_at': created,
+    })
+
+    # A fresh table numbers bookings 1..n in insertion order.
+    booking_id = np.arange(1, n + 1)
+    spend = np.bincount(user, weights=np.where(cancelled, 0.0, amount),
+                        minlength=n_users + 1)[1:]
+    balance = np.round(rnd.uniform(0, 5000, n_users), 2)
+    topup = np.round(spend + balance, 2)
+    has_topup = topup > 0
+    users_ = np.arange(1, n_users + 1)
+    refund = np.flatnonzero(cancelled)
+    ledger = {
+        'user_id': np.concatenate([users_[has_topup], user, user[refund]]),
+        'amount': np.concatenate([topup[has_topup], -amount, amount[refund]]),
+        'transaction_type': np.concatenate([
+            np.full(has_topup.sum(), 'credit', dtype=object),
+            np.full(n, 'debit', dtype=object),
+            np.full(len(refund), 'credit', dtype=object)]),
+        'description': np.concatenate([
+            np.full(has_topup.sum(), 'Wallet top-up', dtype=object),
+            np.full(n, 'Station booking', dtype=object),
+            np.char.add('Refund for cancelled booking #',
+                        booking_id[refund].astype(str)).astype(object)]),
+        'booking_id': np.concatenate([
+            np.full(has_topup.sum(), None, dtype=object),
+            booking_id.astype(object), booking_id[refund].astype(object)]),
+        'created_at': np.concatenate([
+            np.full(has_topup.sum(), str(ANCHOR - np.timedelta64(400, 'D')).replace('T', ' '), dtype=object),
+            created, created[refund]]),
+    }
+    insert(conn, 'wallet_transactions', ledger, 'wallet transactions')
+    # Balance = top-up - spend, recomputed from the ledger to avoid drift.
+    totals = np.bincount(ledger['user_id'].astype(np.int64),
+                         weights=ledger['amount'].astype(float),
+                         minlength=n_users + 1)[1:]
+    insert(conn, 'wallets', {
+        'user_id': users_[has_topup],
+        'balance': np.round(totals[has_topup], 2),
+        'updated_at': np.full(has_topup.sum(), str(ANCHOR).replace('T', ' '),
+                              dtype=object),
+    })
+
+
+def drop_derived(conn):
+    """Drop secondary indexes and triggers for the load; init_db puts them
+    back (and rebuilds what they maintain) afterwards."""
+    for kind in ('index', 'trigger'):
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = ? AND sql IS NOT NULL",
+            (kind,),
+        ).fetchall():
+            conn.execute(f"DROP {kind.upper()} {name}")
+    conn.commit()
+
+
+def generate(volumes: dict, seed: int):
+    rnd = np.random.default_rng(seed)
+    app_db.init_db()
+    with app_db.get_conn() as conn:
+        drop_derived(conn)
+        conn.execute("PRAGMA synchronous = OFF")
+        station_frame = stations(conn, rnd, volumes['stations'])
+        users(conn, rnd, volumes['users'])
+        activity(conn, rnd, volumes, station_frame)
+        bookings(conn, rnd, volumes, station_frame)
+    app_db.close_pool()
+    began = time.perf_counter()
+    app_db.init_db()
+    with app_db.get_conn() as conn:
+        conn.execute("ANALYZE")
+    print(f"  {'indexes + triggers':<20}{'':>12}  "
+          f"rebuilt in {time.perf_counter() - began:.1f}s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", type=Path, default=app_db.DB_PATH)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier for the default row counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true",
+                        help="replace an existing database file")
+    for table, count in VOLUMES.items():
+        parser.add_argument(f"--{table}", type=int,
+                            help=f"row count (default {count:,} x scale)")
+    args = parser.parse_args(argv)
+
+    volumes = {
+        table: getattr(args, table) if getattr(args, table) is not None
+        else max(1, int(count * args.scale))
+        for table, count in VOLUMES.items()
+    }
+    if args.db.exists():
+        if not args.force:
+            print(f"{args.db} exists; pass --force to replace it")
+            return 1
+        for suffix in ('', '-wal', '-shm'):
+            Path(f"{args.db}{suffix}").unlink(missing_ok=True)
+    args.db.parent.mkdir(parents=True, exist_ok=True)
+
+    app_db.DB_PATH = args.db
+    print(f"Generating {args.db} (seed {args.seed})")
+    began = time.perf_counter()
+    generate(volumes, args.seed)
+    app_db.close_pool()
+    print(f"Done in {time.perf_counter() - began:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
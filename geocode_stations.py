@@ -0,0 +1,65 @@
+"""Geocode stations in database/ev_stations.db from local gazetteer files.
+
+Stations are matched on pincode first, then city and state, the pincode's
+sorting district, and finally the city name alone, against one or more
+gazetteer CSVs. data/india_city_centroids.csv ships with the repo and
+gives city-level positions; add a pincode directory (for example the All
+India Pincode Directory CSV from data.gov.in) for street-level ones.
+Resolved places are cached in the database, and stations that match
+nothing are listed rather than guessed.
+
+    python geocode_stations.py [--gazetteer pincodes.csv ...] [--all]
+                               [--refresh-cache] [--report unresolved.csv]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from app_db import geocode_stations, init_db
+
+DEFAULT_GAZETTEER = Path("data/india_city_centroids.csv")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gazetteer", type=Path, action="append",
+                        help="gazetteer CSV; repeat to combine files "
+                             f"(default: {DEFAULT_GAZETTEER})")
+    parser.add_argument("--all", action="store_true",
+                        help="re-geocode stations that already have coordinates")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="forget cached places, e.g. after changing gazetteers")
+    parser.add_argument("--report", type=Path,
+                        help="write unresolved stations to this CSV")
+    args = parser.parse_args(argv)
+
+    gazetteers = args.gazetteer or [DEFAULT_GAZETTEER]
+    missing = [p for p in gazetteers if not p.exists()]
+    if missing:
+        print("Gazetteer not found:", ', '.join(map(str, missing)))
+        return 1
+
+    init_db()
+    stats = geocode_stations(gazetteers, overwrite=args.all,
+                             refresh_cache=args.refresh_cache)
+    unresolved = stats['unresolved']
+    print(f"Geocoded {stats['stations']:,} station(s) in {stats['elapsed_s']}s"
+          + (" from the cache" if stats['from_cache'] else ""))
+    for level, count in stats['resolved'].items():
+        print(f"  {level:<10} {count:,}")
+    print(f"  {'unresolved':<10} {len(unresolved):,}")
+    print(f"Updated coordinates of {stats['updated']:,} station(s)")
+
+    if len(unresolved):
+        print("\nUnresolved by city:")
+        by_city = unresolved['city'].fillna('(no city)').value_counts()
+        for city, count in by_city.head(10).items():
+            print(f"  {city}: {count}")
+        if args.report:
+            unresolved.to_csv(args.report, index=False)
+            print(f"Wrote {len(unresolved):,} unresolved station(s) to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
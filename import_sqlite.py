@@ -1,23 +1,177 @@
+"""Stream a station feed into database/ev_stations.db.
+
+Reads CSV (header row), JSON Lines (one object per line) or a SQL dump of
+INSERT statements in a single pass, without holding the feed in memory,
+and loads it through app_db.bulk_load_stations: a full import builds a
+staging table and swaps it in atomically; ``--delta`` upserts only the
+stations in the feed.
+
+    python import_sqlite.py [feed] [--format csv|jsonl|sql] [--delta]
+                            [--batch-size 5000]
+"""
+import argparse
+import csv
+import json
+import re
+import sys
 from pathlib import Path
-from app_db import init_db, get_conn
+from typing import Any, Dict, Iterator, List, Optional
 
+from app_db import bulk_load_stations, init_db, IMPORT_BATCH_SIZE
 
-def main():
-    init_db()
-    sql_path = Path("ev_charging_station.sql")
-    if not sql_path.exists():
-        print("SQL file not found:", sql_path)
-        return
-    sql = sql_path.read_text(encoding="utf-8")
-    with get_conn() as conn:
-        conn.executescript(
-            "DROP TABLE IF EXISTS ev_charging_stations_reduced;"
+DEFAULT_FEED = Path("ev_charging_station.sql")
+
+INSERT_RE = re.compile(
+    r"^\s*INSERT\s+(?:OR\s+\w+\s+)?INTO\s+[\"`\[]?(\w+)[\"`\]]?\s*"
+    r"(?:\(([^)]*)\))?\s*VALUES\s*(.*);\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+CREATE_RE = re.compile(
+    r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[\"`\[]?(\w+)[\"`\]]?\s*"
+    r"\((.*)\)\s*;\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+# One SQL literal: quoted string, NULL, or a number.
+VALUE_RE = re.compile(
+    r"\s*(?:'((?:[^']|'')*)'|(NULL)|([-+]?[\d.]+(?:[eE][-+]?\d+)?))\s*([,)])",
+    re.IGNORECASE,
+)
+CONSTRAINT_WORDS = {'PRIMARY', 'UNIQUE', 'FOREIGN', 'CHECK', 'CONSTRAINT'}
+
+
+def read_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open(newline='', encoding='utf-8') as fh:
+        yield from csv.DictReader(fh)
+
+
+def read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open(encoding='utf-8') as fh:
+        for line_no, line in enumerate(fh, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"line {line_no}: skipped ({e})", file=sys.stderr)
+
+
+def sql_statements(path: Path) -> Iterator[str]:
+    """Complete statements from a dump, one at a time. A statement ends at
+    a line ending in ';' with every quote closed."""
+    buf: List[str] = []
+    quotes = 0
+    with path.open(encoding='utf-8') as fh:
+        for line in fh:
+            if not buf and (not line.strip() or line.lstrip().startswith('--')):
+                continue
+            buf.append(line)
+            quotes += line.count("'")
+            if quotes % 2 == 0 and line.rstrip().endswith(';'):
+                yield ''.join(buf)
+                buf, quotes = [], 0
+
+
+def parse_values(text: str) -> Iterator[list]:
+    """Row tuples from the ``(...), (...)`` part of an INSERT."""
+    pos = 0
+    while True:
+        start = text.find('(', pos)
+        if start < 0:
+            return
+        pos, row = start + 1, []
+        while True:
+            m = VALUE_RE.match(text, pos)
+            if not m:
+                raise ValueError(f"unparseable VALUES near: {text[pos:pos + 40]!r}")
+            string, null, number, end = m.groups()
+            if string is not None:
+                row.append(string.replace("''", "'"))
+            elif null:
+                row.append(None)
+            else:
+                row.append(number)
+            pos = m.end()
+            if end == ')':
+                break
+        yield row
+
+
+def table_columns(body: str) -> List[str]:
+    columns = []
+    for part in body.split(','):
+        words = part.strip().split()
+        if words and words[0].upper() not in CONSTRAINT_WORDS:
+            columns.append(words[0].strip('"`[]'))
+    return columns
+
+
+def read_sql(path: Path, table: str = 'ev_charging_stations_reduced'
+             ) -> Iterator[Dict[str, Any]]:
+    """Station rows from the INSERT statements of a SQL dump. Other
+    statements are ignored; a CREATE TABLE supplies the column order for
+    INSERTs that do not name their columns."""
+    declared: Optional[List[str]] = None
+    for statement in sql_statements(path):
+        m = CREATE_RE.match(statement)
+        if m and m.group(1) == table:
+            declared = table_columns(m.group(2))
+            continue
+        m = INSERT_RE.match(statement)
+        if not m or m.group(1) != table:
+            continue
+        columns = (
+            [c.strip().strip('"`[]') for c in m.group(2).split(',')]
+            if m.group(2) else declared
         )
-        conn.executescript(sql)
-        conn.commit()
-    print("Imported SQL into database/ev_stations.db with",
-          "fresh schema and data")
+        if not columns:
+            raise ValueError("INSERT without a column list and no CREATE TABLE "
+                             "to take the column order from")
+        for values in parse_values(m.group(3)):
+            yield dict(zip(columns, values))
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'sql': read_sql}
+
+
+def report(stats: Dict[str, Any]):
+    print(f"  {stats['loaded']:,} rows loaded "
+          f"({stats['rows_per_sec']:,} rows/sec)", end='\r', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("feed", nargs='?', type=Path, default=DEFAULT_FEED)
+    parser.add_argument("--format", choices=sorted(READERS),
+                        help="defaults to the feed's file extension")
+    parser.add_argument("--delta", action="store_true",
+                        help="upsert the feed's stations, keep all others")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not args.feed.exists():
+        print("Feed not found:", args.feed)
+        return 1
+    fmt = args.format or args.feed.suffix.lstrip('.').lower()
+    if fmt == 'json':
+        fmt = 'jsonl'
+    if fmt not in READERS:
+        print(f"Unknown feed format {fmt!r}; pass --format")
+        return 1
+
+    init_db()
+    stats = bulk_load_stations(
+        READERS[fmt](args.feed), delta=args.delta,
+        batch_size=args.batch_size, progress=report,
+    )
+    print()
+    print(f"Imported {args.feed} into database/ev_stations.db "
+          f"({stats['mode']}): {stats['loaded']:,} stations in "
+          f"{stats['elapsed_s']}s, {stats['rows_per_sec']:,} rows/sec, "
+          f"{stats['skipped']} skipped")
+    if stats['notified']:
+        print(f"Notified {stats['notified']:,} bookmark holder(s) of status "
+              "changes")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())